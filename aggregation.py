@@ -0,0 +1,80 @@
+import heapq
+from collections import Counter
+
+import numpy as np
+
+# Number of best angles kept per session to find the best angle
+TOP_ANGLES = 12
+
+
+class TopAngles:
+    """Running top-12 (time, angle) pairs of a session.
+
+    Angles are pushed as arrays while frames arrive. Equal angles keep the
+    earliest frame, the same as DataFrame.nlargest.
+    """
+
+    def __init__(self, k=TOP_ANGLES):
+        self.k = k
+        self.count = 0
+        self._heap = []  # (angle, -sequence, time), smallest angle at the root
+        self._float_times = False
+
+    def __len__(self):
+        return self.count
+
+    def push_many(self, times, angles):
+        angles = np.asarray(angles, dtype=np.float64)
+        if len(angles) > self.k:
+            # Only angles >= the batch's k-th largest can reach the top
+            kth = np.partition(angles, len(angles) - self.k)[len(angles) - self.k]
+            candidates = np.flatnonzero(angles >= kth)
+        else:
+            candidates = np.arange(len(angles))
+
+        if not self._float_times and any(isinstance(time, float) for time in times):
+            self._float_times = True
+        for i in candidates.tolist():
+            self._offer(self.count + i, times[i], float(angles[i]))
+        self.count += len(angles)
+
+    def _offer(self, sequence, time, angle):
+        entry = (angle, -sequence, time)
+        if len(self._heap) < self.k:
+            heapq.heappush(self._heap, entry)
+        elif entry > self._heap[0]:
+            heapq.heapreplace(self._heap, entry)
+
+    def items(self):
+        """The kept (time, angle) pairs, highest angle first."""
+        ordered = sorted(self._heap, key=lambda entry: (-entry[0], -entry[1]))
+        if self._float_times:
+            # A float anywhere in the times made pandas cast the whole Time column to float
+            return [(float(time) if type(time) is int else time, angle) for angle, _, time in ordered]
+        return [(time, angle) for angle, _, time in ordered]
+
+    def summary(self, risk_scale):
+        """Average, risk label, best angle and top angles of the session, or None without angles."""
+        if not self._heap:
+            return None
+
+        top = self.items()
+        angles = np.array([angle for _, angle in top])
+        average_angle = angles.mean()
+        top_12_angles = [{'Time': time, 'Angle': angle} for time, angle in top]
+
+        # Most frequent risk label among the top angles (ties go to the first label alphabetically),
+        # then the most frequent whole angle within that label
+        labels = risk_scale.classify(angles).tolist()
+        label_counts = Counter(labels)
+        most_common_count = max(label_counts.values())
+        most_common_label = min(label for label, count in label_counts.items() if count == most_common_count)
+        best_angle = Counter(int(angle) for angle, label in zip(angles, labels)
+                             if label == most_common_label).most_common(1)[0][0]
+
+        return {
+            'average_angle': average_angle,
+            'top_12_angles': top_12_angles,
+            'risk_label': risk_scale.label(average_angle),
+            'best_angle': float(best_angle),
+        }
@@ -1,3 +1,5 @@
+from functools import cached_property
+
 import numpy as np
 
 
@@ -515,4 +517,295 @@ def determine_risk(angle, risk_ranges):
     elif risk_ranges['medium'][0] <= angle < risk_ranges['medium'][1]:
         return 'Medium Risk'
     else:
-        return 'High Risk'
\ No newline at end of file
+        return 'High Risk'
+
+
+class RiskScale:
+    """Risk labels and 0-8 risk amounts for whole arrays of angles, built from an exercise's risk_ranges.
+
+    classify() matches determine_risk. score() maps an angle inside the low, medium
+    or high range linearly onto 0-3, 3-6 or 6-8, and angles outside every range to 0.
+    """
+    LEVELS = ('low', 'medium', 'high')
+    LABELS = np.array(['Low Risk', 'Medium Risk', 'High Risk'], dtype=object)
+    AMOUNT_BANDS = {'low': (0, 3), 'medium': (3, 3), 'high': (6, 2)}  # (start, width)
+
+    def __init__(self, risk_ranges):
+        order = sorted(self.LEVELS, key=lambda level: risk_ranges[level][0])
+        self.levels = np.array([self.LEVELS.index(level) for level in order])
+        self.lows = np.array([risk_ranges[level][0] for level in order], dtype=np.float64)
+        self.highs = np.array([risk_ranges[level][1] for level in order], dtype=np.float64)
+        if np.any(self.highs[:-1] >= self.lows[1:]):
+            raise ValueError(f'Overlapping risk ranges: {risk_ranges}')
+        self.amount_start = np.array([self.AMOUNT_BANDS[level][0] for level in order], dtype=np.float64)
+        self.amount_width = np.array([self.AMOUNT_BANDS[level][1] for level in order], dtype=np.float64)
+
+    def _locate(self, angles):
+        # Index of the only range each angle can fall in: the last one starting at or below it
+        angles = np.asarray(angles, dtype=np.float64)
+        index = np.maximum(np.searchsorted(self.lows, angles, side='right') - 1, 0)
+        return angles, index
+
+    def classify(self, angles):
+        angles, index = self._locate(angles)
+        level = self.levels[index]
+        # As in determine_risk, the medium range excludes its upper bound and
+        # anything outside the low and medium ranges is high risk
+        below_high = np.where(level == 1, angles < self.highs[index], angles <= self.highs[index])
+        inside = (angles >= self.lows[index]) & below_high
+        return self.LABELS[np.where(inside, level, 2)]
+
+    def label(self, angle):
+        return self.classify([angle])[0]
+
+    def score(self, angles):
+        angles, index = self._locate(angles)
+        lows, highs = self.lows[index], self.highs[index]
+        inside = (angles >= lows) & (angles <= highs)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            normalized_value = (angles - lows) / (highs - lows)
+        return np.where(inside, self.amount_start[index] + normalized_value * self.amount_width[index], 0.0)
+
+# === Batch (array-in / array-out) versions of the angle functions ===
+# `points` is a (frames, 17, 2) array of normalized (x, y) keypoints as built by
+# keypoints.decode_frames; missing keypoints are NaN. Every function returns one
+# angle per frame and mirrors the scalar function above it, which stays the reference.
+# A PoseGeometry can be passed instead of the points to share work between exercises.
+
+def _scaled(points, frame_shape):
+    y, x = frame_shape[0], frame_shape[1]
+    return np.asarray(points, dtype=np.float64) * np.array([x, y], dtype=np.float64)
+
+
+class PoseGeometry:
+    """Pixel keypoints of a batch of frames, with the midpoints and limb vectors the angles share.
+
+    Built once when several exercises are scored from the same frames; each midpoint
+    and limb vector is computed the first time an angle function asks for it.
+    """
+
+    def __init__(self, points, frame_shape):
+        self.frame_shape = frame_shape
+        self.points = _scaled(points, frame_shape)
+        self._vectors = {}
+
+    def __len__(self):
+        return len(self.points)
+
+    def vector(self, start, end):
+        """Vector from keypoint `start` to keypoint `end` in every frame."""
+        key = (start, end)
+        if key not in self._vectors:
+            self._vectors[key] = self.points[:, end] - self.points[:, start]
+        return self._vectors[key]
+
+    @cached_property
+    def shoulder_midpoint(self):
+        return (self.points[:, 5] + self.points[:, 6]) / 2
+
+    @cached_property
+    def hip_midpoint(self):
+        return (self.points[:, 11] + self.points[:, 12]) / 2
+
+
+def pose_geometry(points, frame_shape):
+    if isinstance(points, PoseGeometry):
+        return points
+    return PoseGeometry(points, frame_shape)
+
+
+def _norm(vectors):
+    return np.sqrt(vectors[:, 0] * vectors[:, 0] + vectors[:, 1] * vectors[:, 1])
+
+
+def _dot(vectors, other):
+    return vectors[:, 0] * other[:, 0] + vectors[:, 1] * other[:, 1]
+
+
+def calculate_torso_rotation_angle_batch(points, frame_shape, side):
+    g = pose_geometry(points, frame_shape)
+    shoulder_vector = g.vector(5, 6)
+    hip_vector = g.vector(11, 12)
+
+    rotation_angle = np.degrees(np.arctan2(shoulder_vector[:, 1], shoulder_vector[:, 0]) -
+                                np.arctan2(hip_vector[:, 1], hip_vector[:, 0]))
+    if side == 'left':
+        rotation_angle = np.where(rotation_angle < 0, rotation_angle + 360, rotation_angle)
+    else:
+        rotation_angle = np.where(rotation_angle > 0, rotation_angle - 360, rotation_angle)
+
+    return np.clip(np.abs(rotation_angle), 0, 90)
+
+
+def calculate_hip_rotation_internal_angle_batch(points, frame_shape, rotation_type, side):
+    g = pose_geometry(points, frame_shape)
+    knee_index, ankle_index = (13, 15) if side == 'left' else (14, 16)
+    lower_leg_vector = g.vector(knee_index, ankle_index)
+
+    reference_vector = np.array([1, 0]) if rotation_type == 'internal' else np.array([-1, 0])
+    angle = np.degrees(np.arctan2(lower_leg_vector[:, 1], lower_leg_vector[:, 0]) -
+                       np.arctan2(reference_vector[1], reference_vector[0]))
+    if rotation_type == 'internal':
+        angle = np.where(angle < 0, angle + 180, angle)
+
+    return np.clip(angle, 0, 90)
+
+
+def calculate_hip_rotation_external_angle_batch(points, frame_shape, side):
+    g = pose_geometry(points, frame_shape)
+    hip_index, knee_index = (11, 13) if side == 'left' else (12, 14)
+    thigh_vector = g.vector(hip_index, knee_index)
+
+    reference_vector = np.array([0, 1])
+    angle = np.degrees(np.arctan2(thigh_vector[:, 1], thigh_vector[:, 0]) -
+                       np.arctan2(reference_vector[1], reference_vector[0]))
+    angle = np.where(angle < 0, angle + 360, angle)
+    if side == 'left':
+        angle = 360 - angle
+
+    return np.clip(angle, 0, 90)
+
+
+def _forearm_rotation_batch(points, frame_shape, side, reference_vector):
+    g = pose_geometry(points, frame_shape)
+    elbow_index, hand_index = (7, 9) if side == 'left' else (8, 10)
+    forearm_vector = g.vector(elbow_index, hand_index)
+
+    angle = np.degrees(np.arctan2(forearm_vector[:, 1], forearm_vector[:, 0]) -
+                       np.arctan2(reference_vector[1], reference_vector[0]))
+    angle = np.where(angle < 0, angle + 180, angle)
+    if side == 'right':
+        angle = 180 - angle
+
+    return np.clip(angle, 0, 90)
+
+
+def calculate_external_rotation_angle_batch(points, frame_shape, side):
+    return _forearm_rotation_batch(points, frame_shape, side, np.array([-1, 0]))
+
+
+def calculate_internal_rotation_angle_batch(points, frame_shape, side):
+    return _forearm_rotation_batch(points, frame_shape, side, np.array([1, 0]))
+
+
+def calculate_vertical_flexion_angle_batch(points, frame_shape, side):
+    g = pose_geometry(points, frame_shape)
+    shoulder_index, elbow_index = (5, 7) if side == 'left' else (6, 8)
+    arm_vector = g.vector(shoulder_index, elbow_index)
+
+    # Dot product of the normalized arm vector with vertical (0, 1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.degrees(np.arccos(arm_vector[:, 1] / _norm(arm_vector)))
+
+
+def calculate_shoulder_vertical_extension_batch(points, frame_shape, side):
+    return calculate_vertical_flexion_angle_batch(points, frame_shape, side)
+
+
+def _neck_angle_batch(points, frame_shape):
+    g = pose_geometry(points, frame_shape)
+    neck_vector = g.points[:, 0] - g.shoulder_midpoint
+
+    # Dot product with the vertical (0, -1); its norm is 1
+    neck_magnitude = _norm(neck_vector)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        angle = np.degrees(np.arccos(-neck_vector[:, 1] / neck_magnitude))
+    return np.where(neck_magnitude == 0, 0.0, angle)
+
+
+def calculate_neck_extension_angle_batch(points, frame_shape):
+    return _neck_angle_batch(points, frame_shape)
+
+
+def calculate_neck_flexion_angle_batch(points, frame_shape):
+    return _neck_angle_batch(points, frame_shape)
+
+
+def calculate_neck_tilt_batch(points, frame_shape, side):
+    g = pose_geometry(points, frame_shape)
+    nose = g.points[:, 0]
+    shoulder_midpoint = g.shoulder_midpoint
+
+    vertical_ref = np.stack([shoulder_midpoint[:, 0], shoulder_midpoint[:, 1] - 100], axis=1)
+    vertical_vector = vertical_ref - shoulder_midpoint
+    head_vector = nose - shoulder_midpoint
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        angle = np.degrees(np.arccos(_dot(head_vector, vertical_vector) /
+                                     (_norm(head_vector) * _norm(vertical_vector))))
+    if side == 'right':
+        angle = np.where(nose[:, 0] > shoulder_midpoint[:, 0], 0.0, angle)
+    elif side == 'left':
+        angle = np.where(nose[:, 0] < shoulder_midpoint[:, 0], 0.0, angle)
+
+    return angle
+
+
+def calculate_lateral_flexion_angle_batch(points, frame_shape):
+    g = pose_geometry(points, frame_shape)
+    left_vector = g.vector(11, 5)
+    right_vector = g.vector(12, 6)
+
+    left_angle = 90 - np.abs(np.degrees(np.arctan2(left_vector[:, 1], left_vector[:, 0])))
+    right_angle = 90 - np.abs(np.degrees(np.arctan2(right_vector[:, 1], right_vector[:, 0])))
+
+    return np.where(left_angle > right_angle, left_angle, right_angle)
+
+
+def calculate_abduction_angle_batch(points, frame_shape):
+    g = pose_geometry(points, frame_shape)
+    angles = []
+    for shoulder_index, elbow_index in [(5, 7), (6, 8)]:  # Left and right arms
+        arm_vector = g.vector(shoulder_index, elbow_index)
+        # Dot product of the normalized arm vector with vertical up (0, -1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            angle = np.degrees(np.arccos(-arm_vector[:, 1] / _norm(arm_vector)))
+        angles.append(180 - angle)
+
+    left, right = angles
+    return np.where(right < left, right, left)
+
+
+def calculate_knee_raise_angle_batch(points, frame_shape, side):
+    g = pose_geometry(points, frame_shape)
+    hip_index, knee_index = (11, 13) if side == 'left' else (12, 14)
+    hip = g.points[:, hip_index]
+
+    vertical_ref = np.stack([hip[:, 0], hip[:, 1] + 100], axis=1)
+    knee_vector = g.vector(hip_index, knee_index)
+    vertical_vector = vertical_ref - hip
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.degrees(np.arccos(_dot(knee_vector, vertical_vector) /
+                                    (_norm(knee_vector) * _norm(vertical_vector))))
+
+
+def calculate_spine_angle_batch(points, frame_shape, exercise_type):
+    g = pose_geometry(points, frame_shape)
+    shoulder_midpoint = g.shoulder_midpoint
+    hip_midpoint = g.hip_midpoint
+
+    if exercise_type == 'flexion':
+        reference_line = hip_midpoint - shoulder_midpoint
+    elif exercise_type == 'extension':
+        reference_line = shoulder_midpoint - hip_midpoint
+    else:
+        reference_line = g.vector(5, 6)
+
+    # The vertical line is (0, 1) scaled by the reference length
+    length = _norm(reference_line)
+    vertical_line = np.stack([0 * length, length], axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        angle = np.degrees(np.arccos(_dot(reference_line, vertical_line) /
+                                     (length * _norm(vertical_line))))
+
+    return angle if exercise_type != 'extension' else 180 - angle
+
+
+def calculate_back_flexion_angle_batch(points, frame_shape):
+    g = pose_geometry(points, frame_shape)
+    spine_vector = g.hip_midpoint - g.shoulder_midpoint
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cosine_angle = spine_vector[:, 1] / _norm(spine_vector)
+    return np.degrees(np.arccos(np.clip(cosine_angle, -1.0, 1.0)))
@@ -0,0 +1,220 @@
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+from db import connect
+from metrics import ANGLE_WRITER_BATCH_SECONDS, ANGLE_WRITER_ROWS
+
+logger = logging.getLogger(__name__)
+
+# Write-behind tuning, overridable from the environment
+WRITE_BEHIND_ENABLED = os.environ.get('ANGLE_WRITE_BEHIND', '1') != '0'
+MAX_PENDING_ROWS = int(os.environ.get('ANGLE_WRITER_MAX_PENDING_ROWS', 200_000))
+BATCH_ROWS = int(os.environ.get('ANGLE_WRITER_BATCH_ROWS', 5_000))
+FLUSH_INTERVAL = float(os.environ.get('ANGLE_WRITER_FLUSH_INTERVAL', 0.5))
+
+INSERT_ANGLE_DATA = '''
+INSERT INTO angle_data (user_uuid, exercise_type, angle, timestamp)
+VALUES (?, ?, ?, ?)
+'''
+
+
+class AngleWriter:
+    """Bounded background writer for angle_data rows.
+
+    Request handlers submit their rows and return without waiting for the disk.
+    A single thread group-commits whatever is pending once BATCH_ROWS rows have
+    queued up or FLUSH_INTERVAL seconds have passed. When MAX_PENDING_ROWS rows
+    are already waiting, submit() returns None at once so the caller can write
+    the rows itself: callers hold the SQLite write lock, which the writer thread
+    needs to make room.
+
+    Rows submitted with `held` are queued but not written until release(), and
+    cancel() drops them, so a transaction can queue its rows and still roll back.
+    """
+
+    def __init__(self, path=None, max_pending_rows=MAX_PENDING_ROWS, batch_rows=BATCH_ROWS,
+                 flush_interval=FLUSH_INTERVAL):
+        self.path = path
+        self.max_pending_rows = max_pending_rows
+        self.batch_rows = batch_rows
+        self.flush_interval = flush_interval
+        self._pending = deque()  # (sequence, rows) per submit()
+        self._pending_rows = 0  # queued plus being written
+        self._sequence = 0  # number of submit() calls so far
+        self._writing = []  # the (sequence, rows) items of the batch being written
+        self._held = set()  # sequences of the submissions waiting for release() or cancel()
+        self._discarded = {}  # user_uuid -> that user's rows submitted up to this sequence are not written
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = None
+
+    @property
+    def pending_rows(self):
+        return self._pending_rows
+
+    def submit(self, rows, held=False):
+        """Queue `rows`; returns the submission's sequence number, or None if they were not queued."""
+        rows = list(rows)
+        with self._cond:
+            # A batch larger than the whole queue is still accepted when the queue is empty
+            if not rows or self._closed or (self._pending_rows and
+                                            self._pending_rows + len(rows) > self.max_pending_rows):
+                return None
+            self._start()
+            self._sequence += 1
+            self._pending.append((self._sequence, rows))
+            self._pending_rows += len(rows)
+            if held:
+                self._held.add(self._sequence)
+            self._cond.notify_all()
+            return self._sequence
+
+    def release(self, sequence):
+        """Let the writer write the rows of a held submission."""
+        with self._cond:
+            self._held.discard(sequence)
+            self._cond.notify_all()
+
+    def cancel(self, sequence):
+        """Drop the rows of a held submission, e.g. when the transaction that queued them rolled back."""
+        with self._cond:
+            self._held.discard(sequence)
+            for item in self._pending:
+                if item[0] == sequence:
+                    self._pending.remove(item)
+                    self._pending_rows -= len(item[1])
+                    break
+            self._cond.notify_all()
+
+    def flush(self, timeout=None):
+        """Wait until every submitted row is written; returns False on timeout."""
+        with self._cond:
+            return self._cond.wait_for(lambda: self._pending_rows == 0, timeout)
+
+    def discard(self, user_uuid):
+        """Never write the user's rows submitted so far; returns how many were not written yet.
+
+        Call it from the transaction deleting the user's angle_data rows: the writer
+        takes the write lock before it filters a batch, so every row is either written
+        before that transaction and deleted by it, or dropped here.
+        """
+        with self._cond:
+            self._discarded[user_uuid] = self._sequence
+            dropped = sum(row[0] == user_uuid for _, rows in self._writing for row in rows)
+            pending = deque()
+            for sequence, rows in self._pending:
+                kept = [row for row in rows if row[0] != user_uuid]
+                dropped += len(rows) - len(kept)
+                if kept:
+                    pending.append((sequence, kept))
+                self._pending_rows -= len(rows) - len(kept)
+            self._pending = pending
+            self._cond.notify_all()
+            return dropped
+
+    def close(self, timeout=None):
+        """Stop accepting rows, write the ones still pending and stop the thread."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+            thread = self._thread
+        if thread:
+            thread.join(timeout)
+
+    def _start(self):
+        # Started lazily so it runs in the worker process, not in a pre-fork master
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='angle-writer', daemon=True)
+            self._thread.start()
+
+    def _ready(self):
+        return any(sequence not in self._held for sequence, _ in self._pending)
+
+    def _next_batch(self):
+        with self._cond:
+            while True:
+                # Once closed, wait only for the held submissions still pending
+                while not self._ready() and not (self._closed and not self._pending):
+                    self._cond.wait()
+                # Group commit: give other requests up to flush_interval to add their rows
+                deadline = time.monotonic() + self.flush_interval
+                while not self._closed and self._pending_rows < self.batch_rows:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                self._writing = [item for item in self._pending if item[0] not in self._held]
+                self._pending = deque(item for item in self._pending if item[0] in self._held)
+                # Nothing to write is only returned once closed; discard() may have emptied the batch
+                if self._writing or (self._closed and not self._pending):
+                    return self._writing
+
+    def _rows_to_write(self, batch):
+        # Rows of users deleted since they were submitted are skipped
+        with self._cond:
+            discarded = dict(self._discarded)
+        return [row for sequence, rows in batch for row in rows
+                if discarded.get(row[0], 0) < sequence]
+
+    def _write(self, conn, batch):
+        with conn:
+            # Filtered once the write lock is held, so no deletion can slip in between
+            conn.execute('BEGIN IMMEDIATE')
+            rows = self._rows_to_write(batch)
+            conn.executemany(INSERT_ANGLE_DATA, rows)
+        return len(rows)
+
+    def _run(self):
+        conn = None
+        try:
+            while True:
+                batch = self._next_batch()
+                if not batch:
+                    return
+                batch_rows = sum(len(rows) for _, rows in batch)
+                start = time.perf_counter()
+                try:
+                    if conn is None:
+                        conn = connect(self.path)
+                    written = self._write(conn, batch)
+                    ANGLE_WRITER_ROWS.inc('written', amount=written)
+                    ANGLE_WRITER_ROWS.inc('discarded', amount=batch_rows - written)
+                except Exception:
+                    logger.exception('Dropped %d angle_data rows', batch_rows)
+                    ANGLE_WRITER_ROWS.inc('dropped', amount=batch_rows)
+                    # Reconnect for the next batch
+                    if conn is not None:
+                        conn.close()
+                        conn = None
+                ANGLE_WRITER_BATCH_SECONDS.observe(time.perf_counter() - start)
+                with self._cond:
+                    self._pending_rows -= batch_rows
+                    self._writing = []
+                    # Marks older than every queued row are not needed anymore
+                    oldest = self._pending[0][0] if self._pending else self._sequence + 1
+                    self._discarded = {user: sequence for user, sequence in self._discarded.items()
+                                       if sequence >= oldest}
+                    self._cond.notify_all()
+        finally:
+            if conn is not None:
+                conn.close()
+            with self._cond:
+                if self._pending_rows:
+                    # The thread is dying: drop what is left so flush() returns, and restart on the next submit
+                    logger.error('Angle writer stopped, dropped %d angle_data rows', self._pending_rows)
+                    ANGLE_WRITER_ROWS.inc('dropped', amount=self._pending_rows)
+                    self._pending.clear()
+                    self._held.clear()
+                    self._writing = []
+                    self._pending_rows = 0
+                self._thread = None
+                self._cond.notify_all()
+
+
+angle_writer = AngleWriter()
+# Drain pending rows when the worker shuts down
+atexit.register(angle_writer.close)
@@ -1,103 +1,233 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context, g, has_request_context
 from flask_cors import CORS
-import pandas as pd
-from config import exercise_config
-from angle_functions import determine_risk
+from json_codec import FastJSONProvider
+import numpy as np
+from aggregation import TopAngles
+from angle_functions import PoseGeometry
+from exercise_registry import EXERCISES, UnknownExercise, get_exercise
+from live_sessions import LiveSessionStore
+from response_cache import ResponseCache
+from keypoints import (decode_frames, decode_packed, decimate, frames_with_keypoints, msgpack, InvalidFrames,
+                       DECIMATION_MAX_FPS, FRAME_DECIMATION, FRAME_TIME_UNIT, MSGPACK_MIMETYPES, PACKED_MIMETYPE)
+import os
 import uuid
-import sqlite3
-import json
+from datetime import datetime, timezone
+from db import get_connection
+from angle_writer import angle_writer, INSERT_ANGLE_DATA, WRITE_BEHIND_ENABLED
+from migrations import migrate
+import json_codec
+import queue
+import math
 from collections import Counter
-from assessment_config import ASSESSMENT_CONFIG
-from config import exercise_config
+from assessment_plan import ASSESSMENT_PLANS
+from metrics import (REGISTRY, CONTENT_TYPE, Gauge, REQUEST_SECONDS, STAGE_SECONDS, FRAMES_RECEIVED,
+                     FRAMES_ACCEPTED, FRAMES_REJECTED, FRAMES_DECIMATED, SQLITE_WAIT_SECONDS)
+import time
+import hmac
+import tracemalloc
+from profiling import RequestProfiler, tracemalloc_snapshot
+from retention import angle_history
+from parallel import angle_pool
 
 app = Flask(__name__)
-CORS(app, resources={r"/*": {"origins": "*", "methods": ["GET", "POST","PATCH","PUT","DELETE"]}}) # This will enable CORS for all routes
-
-# Connect to SQLite database
-def init_db():
-    conn = sqlite3.connect('AI_DB.db')
-    cursor = conn.cursor()
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS users (
-        userId TEXT PRIMARY KEY,
-        userUUID TEXT NOT NULL
-    )
-    ''')
-    conn.commit()
-    conn.close()
+app.json = FastJSONProvider(app)
+CORS(app, resources={r"/*": {"origins": "*", "methods": ["GET", "POST","PATCH","PUT","DELETE"]}}, expose_headers=["ETag"]) # This will enable CORS for all routes
+response_cache = ResponseCache()
+
+# === Metrics ===
+profiler = RequestProfiler()
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    g.profile = profiler.begin(request.url_rule.rule if request.url_rule else None, request.method)
+
+@app.after_request
+def record_response_status(response):
+    g.response_status = response.status_code
+    return response
+
+@app.teardown_request
+def observe_request(exc):
+    profiler.end(g.pop('profile', None))
+    started = g.pop('request_started', None)
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        REQUEST_SECONDS.observe(time.perf_counter() - started, route, request.method, g.get('response_status', 500))
+
+def stage(name):
+    # Times one stage of the current endpoint
+    return STAGE_SECONDS.time(request.endpoint if has_request_context() else '', name)
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
+
+# === Admin ===
+# Profiling and memory snapshots of the worker that serves the request. The
+# endpoints only exist when ADMIN_TOKEN is set and need it in X-Admin-Token.
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN', '')
+
+def admin_denied():
+    if not ADMIN_TOKEN:
+        return jsonify({"error": "Not found"}), 404
+    if not hmac.compare_digest(request.headers.get('X-Admin-Token', '').encode(), ADMIN_TOKEN.encode()):
+        return jsonify({"error": "Unauthorized"}), 401
+    return None
+
+def positive_number(data, name, integer=False):
+    # data[name] if it is a positive number (an integer if `integer`), None if it is missing
+    value = data.get(name)
+    if value is None:
+        return None
+    kinds = int if integer else (int, float)
+    if isinstance(value, bool) or not isinstance(value, kinds) or not 0 < value < float('inf'):
+        raise ValueError(f"{name} must be a positive {'integer' if integer else 'number'}")
+    return value
+
+@app.route('/admin/profile', methods=['POST'])
+def start_profile():
+    # {"route": "/", "method": "PATCH", "requests": 20, "seconds": 60, "mode": "cprofile" | "sample"}
+    denied = admin_denied()
+    if denied:
+        return denied
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or not data.get('route') or not isinstance(data['route'], str):
+        return jsonify({"error": "Missing route"}), 400
+    if not isinstance(data.get('method') or '', str):
+        return jsonify({"error": "method must be a string"}), 400
+    try:
+        status = profiler.start(data['route'], data.get('method'), data.get('mode', 'cprofile'),
+                                positive_number(data, 'requests', integer=True), positive_number(data, 'seconds'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(status), 201
+
+@app.route('/admin/profile', methods=['GET'])
+def get_profile():
+    # ?output=text (pstats listing, default) | pstats (marshalled stats) | collapsed (flamegraph input)
+    denied = admin_denied()
+    if denied:
+        return denied
+    output = request.args.get('output', 'text')
+    report = profiler.report(output, request.args.get('sort', 'cumulative'), request.args.get('limit', 50, type=int))
+    if report is None:
+        return jsonify({"error": "No profile has been started"}), 404
+    if output == 'pstats':
+        return Response(report, mimetype='application/octet-stream',
+                        headers={'Content-Disposition': 'attachment; filename=profile.pstats'})
+    return Response(report, mimetype='text/plain')
+
+@app.route('/admin/profile', methods=['DELETE'])
+def stop_profile():
+    denied = admin_denied()
+    if denied:
+        return denied
+    return jsonify(profiler.stop() or {})
+
+@app.route('/admin/tracemalloc', methods=['POST'])
+def control_tracemalloc():
+    # {"action": "start", "frames": 1} or {"action": "stop"}
+    denied = admin_denied()
+    if denied:
+        return denied
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"error": "action must be start or stop"}), 400
+    if data.get('action') == 'start':
+        try:
+            frames = positive_number(data, 'frames', integer=True) or 1
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+    elif data.get('action') == 'stop':
+        tracemalloc.stop()
+    else:
+        return jsonify({"error": "action must be start or stop"}), 400
+    return jsonify({"tracing": tracemalloc.is_tracing()})
+
+@app.route('/admin/tracemalloc', methods=['GET'])
+def get_tracemalloc():
+    # ?limit=25&key=lineno|filename|traceback
+    denied = admin_denied()
+    if denied:
+        return denied
+    key_type = request.args.get('key', 'lineno')
+    if key_type not in ('lineno', 'filename', 'traceback'):
+        return jsonify({"error": "key must be lineno, filename or traceback"}), 400
+    snapshot = tracemalloc_snapshot(request.args.get('limit', 25, type=int), key_type)
+    if snapshot is None:
+        return jsonify({"error": "tracemalloc is not tracing; POST {\"action\": \"start\"} first"}), 409
+    return Response(snapshot, mimetype='text/plain')
 
 # Function to add a new user to the SQLite DB
 def register_user_in_db(user_id, user_uuid):
-    conn = sqlite3.connect('AI_DB.db')
-    cursor = conn.cursor()
-    cursor.execute('INSERT INTO users (userId, userUUID) VALUES (?, ?)', (user_id, user_uuid))
-    conn.commit()
-    conn.close()
+    conn = get_connection()
+    with conn:
+        conn.execute('INSERT INTO users (userId, userUUID) VALUES (?, ?)', (user_id, user_uuid))
 
 # Function to get the UUID for a user from the SQLite DB
 def get_user_uuid_from_db(user_id):
-    conn = sqlite3.connect('AI_DB.db')
+    conn = get_connection()
     cursor = conn.cursor()
     cursor.execute('SELECT userUUID FROM users WHERE userId = ?', (user_id,))
     result = cursor.fetchone()
-    conn.close()
     return result[0] if result else None
 
-def store_angle_data(user_uuid, exercise_type, angle):
-    conn = sqlite3.connect('AI_DB.db')
-    cursor = conn.cursor()
-    cursor.execute('''
-    INSERT INTO angle_data (user_uuid, exercise_type, angle, timestamp)
-    VALUES (?, ?, ?, CURRENT_TIMESTAMP)
-    ''', (user_uuid, exercise_type, angle))
-    conn.commit()
-    conn.close()
-
-def evaluate_performance(user_uuid, exercise_type):
-    # Connect to database to fetch historical angle data
-    conn = sqlite3.connect('AI_DB.db')
+# Every write to a user's data bumps their version, which invalidates cached responses
+def bump_user_version(conn, user_uuid):
+    conn.execute('''
+    INSERT INTO user_versions (user_uuid, version) VALUES (?, 1)
+    ON CONFLICT (user_uuid) DO UPDATE SET version = version + 1
+    ''', (user_uuid,))
+
+def get_user_version(user_uuid):
+    row = get_connection().execute('SELECT version FROM user_versions WHERE user_uuid = ?', (user_uuid,)).fetchone()
+    return row[0] if row else 0
+
+def evaluate_performance(user_uuid, exercise_type, pending_angles=()):
+    # pending_angles are this request's angles that are not committed yet
+    min_threshold = get_exercise(exercise_type).angle_min
+
+    # Read the running aggregate instead of rescanning the whole angle history
+    conn = get_connection()
     cursor = conn.cursor()
     cursor.execute('''
-        SELECT angle, timestamp 
-        FROM angle_data 
+        SELECT attempts, below_min, angle_min
+        FROM exercise_stats
         WHERE user_uuid = ? AND exercise_type = ?
-        ORDER BY timestamp DESC 
-         
     ''', (user_uuid, exercise_type))
+    row = cursor.fetchone()
 
-    results = cursor.fetchall()
-    conn.close()
+    attempts, failures = 0, 0
+    if row:
+        attempts, failures, stats_angle_min = row
+        if stats_angle_min != min_threshold:
+            # angle_min changed since the aggregate was built, recount from the histogram
+            failures = count_below_threshold(cursor, user_uuid, exercise_type, min_threshold)
 
     # Check if the user failed to meet the angle threshold
-    min_threshold = exercise_config[exercise_type]['angle_min']
-    failures = [angle for angle, _ in results if angle < min_threshold]
-    fail_count = len(failures) / (len(results))
-    
-
-
+    attempts += len(pending_angles)
+    failures += len([angle for angle in pending_angles if angle < min_threshold])
+    fail_count = failures / attempts
 
     if fail_count > 0.85:  # Arbitrary threshold, can be adjusted
         return {"skip": True, "message": "You can skip this exercise."}
     else:
         return {"skip": False, "message": "Please continue trying."}
 
-# Sample database table creation for storing angles
-def init_angle_data_db():
-    conn = sqlite3.connect('AI_DB.db')
-    cursor = conn.cursor()
+def count_below_threshold(cursor, user_uuid, exercise_type, threshold):
+    # Bins hold whole degrees, so this is exact for integer thresholds
     cursor.execute('''
-    CREATE TABLE IF NOT EXISTS angle_data (
-        user_uuid TEXT,
-        exercise_type TEXT,
-        angle REAL,
-        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-    )
-    ''')
-    conn.commit()
-    conn.close()
-# Initialize the database
-init_db()
-init_angle_data_db()
+        SELECT COALESCE(SUM(count), 0)
+        FROM exercise_histogram
+        WHERE user_uuid = ? AND exercise_type = ? AND bin < ?
+    ''', (user_uuid, exercise_type, math.ceil(threshold)))
+    return cursor.fetchone()[0]
+
+# Create or upgrade the database schema once at startup
+migrate()
 # Register user route
 @app.route('/', methods=['POST'])
 def register_user():
@@ -117,94 +247,581 @@ def register_user():
 
     return jsonify({"userUUID": user_uuid}), 201
 
-# Function to save results to SQLite database
-def save_results_to_db(user_uuid,  exercise_type , average_angle, risk_label, best_angle ,top_12_angles, skip):
-    conn = sqlite3.connect('AI_DB.db')
-    cursor = conn.cursor()
-    
-    # Create table if not exists
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS results (
-        user_uuid TEXT,
-        exercise_type TEXT,
-        average_angle REAL,
-        risk_label TEXT,
-        best_angle TEXT,
-        top_12_angles TEXT,
-        skip TEXT
-    )
-    ''')
-    
-    # Insert the result into the table
-    cursor.execute('''
-    INSERT INTO results (user_uuid, exercise_type, average_angle, risk_label, best_angle, top_12_angles, skip)
-    VALUES (?, ?, ?, ?, ?, ?, ?)
-    ''', (user_uuid, exercise_type, average_angle, risk_label, best_angle ,json.dumps(top_12_angles), skip))
-    
-    conn.commit()
-    conn.close()
-
-
+class UnitOfWork:
+    """Collects the angle and result rows of one request and writes them in a single transaction.
+
+    The raw angle_data rows are telemetry: with write-behind enabled they are queued
+    on the background angle_writer instead of being written inline, and only written
+    once the transaction has committed. The exercise stats count every scored angle,
+    including those left out of angle_data by decimation.
+    """
+
+    def __init__(self):
+        self.angle_rows = []
+        self.scored_rows = []
+        self.result_rows = []
+        self._angles = {}  # (user_uuid, exercise_type) -> pending scored angles, for pending_angles()
+
+    def store_angles(self, user_uuid, exercise_type, angles, stored=None):
+        # `angles` count for the stats and skip evaluation; only `stored` (all of them by default) go to angle_data
+        rows = [(user_uuid, exercise_type, angle) for angle in angles]
+        self.scored_rows.extend(rows)
+        self.angle_rows.extend(rows if stored is None else ((user_uuid, exercise_type, angle) for angle in stored))
+        self._angles.setdefault((user_uuid, exercise_type), []).extend(angles)
+
+    def mark(self):
+        return len(self.angle_rows), len(self.scored_rows), len(self.result_rows)
+
+    def rollback_to(self, mark):
+        # Drop the rows queued since mark(), e.g. by a batch item that failed
+        del self.angle_rows[mark[0]:]
+        del self.scored_rows[mark[1]:]
+        del self.result_rows[mark[2]:]
+        self._angles = {}
+        for user_uuid, exercise_type, angle in self.scored_rows:
+            self._angles.setdefault((user_uuid, exercise_type), []).append(angle)
+
+    def pending_angles(self, user_uuid, exercise_type):
+        return self._angles.get((user_uuid, exercise_type), [])
+
+    def save_results(self, user_uuid, exercise_type, average_angle, risk_label, best_angle, top_12_angles, skip):
+        self.result_rows.append((user_uuid, exercise_type, average_angle, risk_label, best_angle,
+                                 json_codec.dumps(top_12_angles), skip))
+
+    def exercise_stats(self):
+        # Per-(user, exercise) attempt count, below-threshold count and angle histogram of the pending angles
+        stats = {}
+        for user_uuid, exercise_type, angle in self.scored_rows:
+            key = (user_uuid, exercise_type)
+            if key not in stats:
+                stats[key] = [0, 0, Counter()]
+            entry = stats[key]
+            entry[0] += 1
+            entry[1] += angle < get_exercise(exercise_type).angle_min
+            entry[2][int(angle)] += 1
+        return stats
+
+    def commit(self):
+        # Same format as SQLite's CURRENT_TIMESTAMP, taken now since the rows may be written later
+        timestamp = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+        angle_rows = [row + (timestamp,) for row in self.angle_rows]
+        write_behind = WRITE_BEHIND_ENABLED
+        changed_users = sorted({row[0] for row in self.scored_rows} | {row[0] for row in self.result_rows})
+
+        conn = get_connection()
+        queued = None
+        try:
+            # The connection context manager commits on success and rolls back on any error
+            with conn:
+                cursor = conn.cursor()
+                with SQLITE_WAIT_SECONDS.time('unit_of_work'):
+                    cursor.execute('BEGIN IMMEDIATE')
+                # Queued while the write lock is held, so a DELETE of these users that runs after
+                # this commit always finds the rows, written or queued (see AngleWriter.discard),
+                # but held back until the commit succeeds. If the writer's queue is full, write
+                # the rows here instead (backpressure): waiting for room would hold the lock it needs
+                queued = angle_writer.submit(angle_rows, held=True) if write_behind else None
+                if not queued:
+                    cursor.executemany(INSERT_ANGLE_DATA, angle_rows)
+                self._write_stats_and_results(cursor, timestamp)
+                for user_uuid in changed_users:
+                    bump_user_version(conn, user_uuid)
+        except BaseException:
+            if queued:
+                angle_writer.cancel(queued)
+            raise
+        if queued:
+            angle_writer.release(queued)
+        for user_uuid in changed_users:
+            response_cache.invalidate(user_uuid)
+
+        self.angle_rows = []
+        self.scored_rows = []
+        self.result_rows = []
+        self._angles = {}
+
+    def _write_stats_and_results(self, cursor, timestamp):
+        for (user_uuid, exercise_type), (attempts, below_min, histogram) in self.exercise_stats().items():
+            angle_min = get_exercise(exercise_type).angle_min
+            cursor.executemany('''
+            INSERT INTO exercise_histogram (user_uuid, exercise_type, bin, count)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT (user_uuid, exercise_type, bin) DO UPDATE SET count = count + excluded.count
+            ''', [(user_uuid, exercise_type, bin_, count) for bin_, count in histogram.items()])
+            # Rebase the below-threshold count first if angle_min changed since the last write
+            cursor.execute('''
+            UPDATE exercise_stats SET angle_min = ?, below_min = (
+                SELECT COALESCE(SUM(count), 0) FROM exercise_histogram h
+                WHERE h.user_uuid = exercise_stats.user_uuid AND h.exercise_type = exercise_stats.exercise_type
+                AND h.bin < ?
+            ) - ?
+            WHERE user_uuid = ? AND exercise_type = ? AND angle_min IS NOT ?
+            ''', (angle_min, math.ceil(angle_min), below_min, user_uuid, exercise_type, angle_min))
+            cursor.execute('''
+            INSERT INTO exercise_stats (user_uuid, exercise_type, attempts, below_min, angle_min)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (user_uuid, exercise_type) DO UPDATE SET
+                attempts = attempts + excluded.attempts,
+                below_min = below_min + excluded.below_min
+            ''', (user_uuid, exercise_type, attempts, below_min, angle_min))
+        cursor.executemany('''
+        INSERT INTO results (user_uuid, exercise_type, average_angle, risk_label, best_angle, top_12_angles, skip,
+                             created_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', [row + (timestamp,) for row in self.result_rows])
+
+
+
+class InvalidMeta(ValueError):
+    # A session's meta is missing fields or has invalid values; its message is returned with a 400
+    pass
+
+
+class SessionScorer:
+    """Scores one exercise session; frames can be added all at once or chunk by chunk.
+
+    With `decimate`, accepted frames in which the exercise's keypoints moved less than
+    its movement_threshold (in pixels) since the last stored frame are not stored in
+    angle_data; `max_fps` caps the stored frames' rate. Every accepted frame still
+    counts for the top 12 angles and the exercise stats, so skip decisions are the
+    same with or without decimation.
+    """
+
+    def __init__(self, user_uuid, exercise_type, frame_shape, unit_of_work=None, decimate=False, max_fps=0):
+        # Aliases resolve to the canonical spec, and its key is what gets stored
+        self.spec = get_exercise(exercise_type)
+        self.user_uuid = user_uuid
+        self.exercise_type = self.spec.key
+        self.frame_shape = frame_shape
+        self.top_angles = TopAngles()
+        self.unit_of_work = unit_of_work or UnitOfWork()
+        self.movement_threshold = self.spec.movement_threshold if decimate else 0
+        self.min_interval = 1 / (max_fps * FRAME_TIME_UNIT) if max_fps else 0
+        self._last_kept = None
+
+    def add_frames(self, content):
+        """Score a list of frames as sent in the `content` field."""
+        with stage('decode'):
+            times, points, present = decode_frames(content)
+        return self.add_points(times, points, present)
+
+    def add_points(self, times, points, present, geometry=None, angles=None):
+        # Returns the indices of the frames whose angle was accepted, and those angles.
+        # `angles` are every frame's angles when they were computed beforehand, e.g. by the angle_pool
+        if angles is None and geometry is None and angle_pool.accepts(len(times)):
+            with stage('angles_parallel'):
+                angles = angle_pool.compute([self.exercise_type], points, self.frame_shape)[self.exercise_type]
+        # Compute every frame's angle in one call
+        with stage('angles'):
+            valid = frames_with_keypoints(present, self.spec.keypoints)
+            if angles is not None:
+                angles = np.where(valid, angles, np.nan)
+            else:
+                angles = np.full(len(times), np.nan)
+                if valid.any():
+                    if geometry is None:
+                        angles[valid] = self.spec.batch_function(points[valid], self.frame_shape)
+                    else:
+                        # Shared geometry covers every frame; frames missing this exercise's keypoints are dropped
+                        with np.errstate(invalid='ignore'):
+                            angles[valid] = self.spec.batch_function(geometry, self.frame_shape)[valid]
+            accepted = (angles > 0) & (angles < self.spec.angle_max)
+
+        stored = accepted
+        if self.movement_threshold or self.min_interval:
+            # Decimated after scoring: the kernels are cheap, and the top 12 must see every frame
+            with stage('decimate'):
+                stored, self._last_kept = decimate(times, points, accepted, self.spec.keypoints, self.frame_shape,
+                                                   self.movement_threshold, self.min_interval, self._last_kept)
+            FRAMES_DECIMATED.inc(self.exercise_type, amount=int(accepted.sum() - stored.sum()))
+
+        with stage('aggregate'):
+            accepted_indices = np.flatnonzero(accepted)
+            accepted_angles = angles[accepted_indices]
+            self.top_angles.push_many([times[i] for i in accepted_indices], accepted_angles)
+            self.unit_of_work.store_angles(self.user_uuid, self.exercise_type, accepted_angles.tolist(),
+                                           angles[stored].tolist() if stored is not accepted else None)
+
+        FRAMES_RECEIVED.inc(self.exercise_type, amount=len(times))
+        FRAMES_ACCEPTED.inc(self.exercise_type, amount=len(accepted_indices))
+        FRAMES_REJECTED.inc(self.exercise_type, amount=len(times) - len(accepted_indices))
+        return accepted_indices, accepted_angles
+
+    def finish(self, commit=True):
+        """Summarize the session, queue its result row and return the response body."""
+        user_uuid, exercise_type = self.user_uuid, self.exercise_type
+        unit_of_work = self.unit_of_work
+
+        # Top 12 angles, their average and the best angle within the most common risk label
+        with stage('summary'):
+            summary = self.top_angles.summary(self.spec.risk_scale)
+        if summary:
+            average_angle = summary['average_angle']
+            best_angle = summary['best_angle']
+            risk_label = summary['risk_label']
+            top_12_angles = summary['top_12_angles']
+
+            # Store the results in the database, associating them with the userUUID
+            with stage('evaluate_performance'):
+                skipping_response = evaluate_performance(user_uuid, exercise_type,
+                                                         unit_of_work.pending_angles(user_uuid, exercise_type))
+            unit_of_work.save_results(user_uuid, exercise_type, average_angle, risk_label, best_angle , top_12_angles, skipping_response['skip'])
+            response = {
+                "userUUID": user_uuid,
+                "average_angle": average_angle,
+                "best_angle": best_angle,
+                "risk_label": risk_label,
+                "top_angles": top_12_angles,
+                "skip": skipping_response['skip'],
+                "message": skipping_response['message']
+            }
+        else:
+            # Still save an error to the database if no valid angles found
+            unit_of_work.save_results(user_uuid, exercise_type, 0.0 , "High Risk" ,0.0, [],True)
+            response = {"error": "No valid angles found"}
+
+        if commit:
+            with stage('commit'):
+                unit_of_work.commit()
+        return response
+
+
+class MultiExerciseScorer:
+    """Scores several exercises from the same frames in one pass.
+
+    `exercise_types` is a list of exercise keys or "all". Aliases of the same exercise
+    are scored once, under the canonical key. Every chunk of frames is decoded once.
+    Its PoseGeometry (pixel keypoints, midpoints, limb vectors) is shared by all the
+    exercises' angle functions.
+    """
+
+    def __init__(self, user_uuid, exercise_types, frame_shape, unit_of_work=None, decimate=False, max_fps=0):
+        if exercise_types == 'all':
+            exercise_types = list(EXERCISES)
+        elif not isinstance(exercise_types, list) or not exercise_types:
+            raise InvalidMeta('meta.exercise_types must be "all" or a non-empty list of exercise keys')
+        self.user_uuid = user_uuid
+        self.frame_shape = frame_shape
+        self.unit_of_work = unit_of_work or UnitOfWork()
+        self.scorers = {}
+        for exercise_type in exercise_types:
+            key = get_exercise(exercise_type).key
+            if key not in self.scorers:
+                self.scorers[key] = SessionScorer(user_uuid, key, frame_shape, self.unit_of_work, decimate, max_fps)
+
+    def add_frames(self, content):
+        with stage('decode'):
+            times, points, present = decode_frames(content)
+        self.add_points(times, points, present)
+
+    def add_points(self, times, points, present):
+        if angle_pool.accepts(len(times)):
+            # Very large uploads: every exercise's angles from one pass over the process pool
+            with stage('angles_parallel'):
+                angles = angle_pool.compute(list(self.scorers), points, self.frame_shape)
+            for key, scorer in self.scorers.items():
+                scorer.add_points(times, points, present, angles=angles[key])
+            return
+        geometry = PoseGeometry(points, self.frame_shape)
+        for scorer in self.scorers.values():
+            scorer.add_points(times, points, present, geometry)
+
+    def finish(self, commit=True):
+        """Result of every exercise, keyed by exercise; all rows are written in one transaction."""
+        results = {key: scorer.finish(commit=False) for key, scorer in self.scorers.items()}
+        if commit:
+            with stage('commit'):
+                self.unit_of_work.commit()
+        return {"userUUID": self.user_uuid, "results": results}
+
+
+# Values of meta.decimate, as JSON or as form-style strings
+DECIMATE_VALUES = {True: True, False: False, 'true': True, 'false': False, '1': True, '0': False}
+
+def decimation_options(meta):
+    # meta.decimate and meta.max_fps, defaulting to FRAME_DECIMATION and DECIMATION_MAX_FPS
+    decimate = meta.get('decimate', FRAME_DECIMATION)
+    if isinstance(decimate, str):
+        decimate = decimate.lower()
+    if not isinstance(decimate, (bool, str)) or decimate not in DECIMATE_VALUES:
+        raise InvalidMeta('meta.decimate must be true or false')
+    max_fps = meta.get('max_fps')
+    if max_fps is None:
+        max_fps = DECIMATION_MAX_FPS
+    elif isinstance(max_fps, bool) or not isinstance(max_fps, (int, float)) or not 0 <= max_fps < float('inf'):
+        raise InvalidMeta('meta.max_fps must be a non-negative number')
+    return {'decimate': DECIMATE_VALUES[decimate], 'max_fps': float(max_fps)}
+
+def frame_shape_of(meta):
+    # (height, width) from meta.frame_shape
+    try:
+        height, width = meta['frame_shape']['y'], meta['frame_shape']['x']
+    except (KeyError, TypeError):
+        raise InvalidMeta("meta.frame_shape with x and y is required") from None
+    if not all(isinstance(v, (int, float)) and not isinstance(v, bool) and v > 0 for v in (height, width)):
+        raise InvalidMeta("meta.frame_shape x and y must be positive numbers")
+    return height, width
+
+def scorer_for(user_uuid, meta, unit_of_work=None, multi=True):
+    # meta.exercise_types (a list or "all") scores several exercises from one upload, unless multi is False.
+    # Raises InvalidMeta or UnknownExercise for requests to answer with a 400
+    if not isinstance(meta, dict):
+        raise InvalidMeta("meta must be an object")
+    frame_shape = frame_shape_of(meta)
+    options = decimation_options(meta)
+    if multi and 'exercise_types' in meta:
+        return MultiExerciseScorer(user_uuid, meta['exercise_types'], frame_shape, unit_of_work, **options)
+    if 'exercise_type' not in meta:
+        raise InvalidMeta("meta.exercise_type is required")
+    return SessionScorer(user_uuid, meta['exercise_type'], frame_shape, unit_of_work, **options)
+
+
+# Frames decoded and scored together when a session is streamed
+STREAM_CHUNK_FRAMES = 512
 
 @app.route('/', methods=['PATCH'])
 def calculate_angle():
+    if request.mimetype == 'application/x-ndjson':
+        return calculate_angle_stream()
+    if request.mimetype == PACKED_MIMETYPE:
+        return calculate_angle_packed()
+
+    with stage('parse'):
+        data = request_data()
+    if data is None:
+        return jsonify({"error": "Unsupported payload"}), 415
+    if not isinstance(data, dict) or 'meta' not in data or 'content' not in data or 'userUUID' not in data:
+        return jsonify({"error": "Invalid JSON structure"}), 400
+
+    try:
+        scorer = scorer_for(data['userUUID'], data['meta'])
+        scorer.add_frames(data['content'])
+    except UnknownExercise as e:
+        return jsonify({"error": f"Unknown exercise_type: {e.args[0]}"}), 400
+    except (InvalidMeta, InvalidFrames) as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(scorer.finish())
+
+def request_data():
+    # The session body as a dict: JSON, or MessagePack with the same structure if msgpack is installed
+    if request.mimetype in MSGPACK_MIMETYPES:
+        if msgpack is None:
+            return None
+        return msgpack.unpackb(request.get_data(), raw=False)
+    return request.json
+
+def calculate_angle_packed():
+    # Packed frame buffer (see keypoints.decode_packed); the points go to the
+    # angle functions without building any per-keypoint Python objects
+    try:
+        with stage('decode'):
+            header, times, points, present = decode_packed(request.get_data())
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if 'meta' not in header or 'userUUID' not in header:
+        return jsonify({"error": "Invalid JSON structure"}), 400
+
+    try:
+        scorer = scorer_for(header['userUUID'], header['meta'])
+    except UnknownExercise as e:
+        return jsonify({"error": f"Unknown exercise_type: {e.args[0]}"}), 400
+    except InvalidMeta as e:
+        return jsonify({"error": str(e)}), 400
+    scorer.add_points(times, points, present)
+    return jsonify(scorer.finish())
+
+def calculate_angle_stream():
+    # Newline-delimited JSON, optionally sent with chunked transfer encoding: the first
+    # line is {"userUUID": ..., "meta": {...}} and every following line is one frame.
+    # Frames are scored in chunks while the body is still being received.
+    lines = (line for line in request.stream if line.strip())
+    try:
+        header = json_codec.loads(next(lines, b'{}'))
+    except ValueError:
+        return jsonify({"error": "Invalid JSON"}), 400
+    if not isinstance(header, dict) or 'meta' not in header or 'userUUID' not in header:
+        return jsonify({"error": "Invalid JSON structure"}), 400
+
+    try:
+        scorer = scorer_for(header['userUUID'], header['meta'])
+    except UnknownExercise as e:
+        return jsonify({"error": f"Unknown exercise_type: {e.args[0]}"}), 400
+    except InvalidMeta as e:
+        return jsonify({"error": str(e)}), 400
+
+    chunk = []
+    try:
+        for line in lines:
+            try:
+                chunk.append(json_codec.loads(line))
+            except ValueError:
+                # Nothing is written before finish(), so the frames scored so far are dropped
+                return jsonify({"error": "Invalid JSON"}), 400
+            if len(chunk) >= STREAM_CHUNK_FRAMES:
+                scorer.add_frames(chunk)
+                chunk = []
+        scorer.add_frames(chunk)
+    except InvalidFrames as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(scorer.finish())
+
+# Largest number of sessions accepted by one /batch request
+BATCH_MAX_SESSIONS = int(os.environ.get('BATCH_MAX_SESSIONS', 100))
+
+@app.route('/batch', methods=['POST'])
+def calculate_angle_batch():
+    # A list of {userUUID, meta, content} sessions, each scored like PATCH / and all
+    # written in one transaction. Each session gets its own status and body back;
+    # a session that fails leaves nothing behind and does not affect the others.
+    with stage('parse'):
+        sessions = request_data()
+    if sessions is None:
+        return jsonify({"error": "Unsupported payload"}), 415
+    if isinstance(sessions, dict):
+        sessions = sessions.get('sessions')
+    if not isinstance(sessions, list):
+        return jsonify({"error": "Invalid JSON structure"}), 400
+    if len(sessions) > BATCH_MAX_SESSIONS:
+        return jsonify({"error": f"At most {BATCH_MAX_SESSIONS} sessions per batch"}), 413
+
+    unit_of_work = UnitOfWork()
+    results = []
+    for data in sessions:
+        if not isinstance(data, dict) or 'meta' not in data or 'content' not in data or 'userUUID' not in data:
+            results.append({"status": 400, "body": {"error": "Invalid JSON structure"}})
+            continue
+        mark = unit_of_work.mark()
+        try:
+            scorer = scorer_for(data['userUUID'], data['meta'], unit_of_work)
+            scorer.add_frames(data['content'])
+            results.append({"status": 200, "body": scorer.finish(commit=False)})
+        except UnknownExercise as e:
+            unit_of_work.rollback_to(mark)
+            results.append({"status": 400, "body": {"error": f"Unknown exercise_type: {e.args[0]}"}})
+        except (InvalidMeta, InvalidFrames) as e:
+            unit_of_work.rollback_to(mark)
+            results.append({"status": 400, "body": {"error": str(e)}})
+        except Exception:
+            app.logger.exception('Batch session failed')
+            unit_of_work.rollback_to(mark)
+            results.append({"status": 500, "body": {"error": "Session could not be processed"}})
+
+    unit_of_work.commit()
+    return jsonify({"results": results})
+
+# === Live sessions ===
+# The client opens a session, posts frames while recording and gets the angle of
+# every accepted frame, the running top 12 and the current risk label back, both
+# in the POST response and on the session's server-sent event stream. The result
+# is stored once, when the session ends.
+live_sessions = LiveSessionStore()
+
+Gauge('ai_angle_writer_pending_rows', 'angle_data rows queued for the background writer.',
+      lambda: angle_writer.pending_rows)
+Gauge('ai_live_sessions', 'Open live sessions in this worker.', lambda: len(live_sessions))
+Gauge('ai_live_events_queued', 'Live feedback events waiting to be sent to subscribers.',
+      live_sessions.queued_events)
+Gauge('ai_response_cache_entries', 'Entries in the response cache.', lambda: len(response_cache))
+
+@app.route('/live', methods=['POST'])
+def start_live_session():
     data = request.json
-    if 'meta' not in data or 'content' not in data or 'userUUID' not in data:
+    if not isinstance(data, dict) or 'meta' not in data or 'userUUID' not in data:
         return jsonify({"error": "Invalid JSON structure"}), 400
 
-    user_uuid = data['userUUID']
-    frame_shape = (data['meta']['frame_shape']['y'], data['meta']['frame_shape']['x'])
-    keypoints_data = data['content']
-    exercise_type = data['meta']['exercise_type']
-    config = exercise_config[exercise_type]
-    angles_data = []
-
-    for frame in keypoints_data:
-        keypoints = frame['data']
-        if len(keypoints) > 0:
-            dict_keypoints = {kp['id']: kp for kp in keypoints}
-            if all(kp_id in dict_keypoints for kp_id in config['keypoints']):
-                angle = config['angle_function'](dict_keypoints, frame_shape)
-                if 0 < angle < config['angle_max']:
-                    angles_data.append({
-                        'Time': frame['time'],
-                        'Angle': angle
-                    })
-
-                    store_angle_data(user_uuid, exercise_type, angle)
-
-    if angles_data:
-        df = pd.DataFrame(angles_data)
-        df = df.nlargest(12, 'Angle')  # Consider top 12 angles for finding the best angle
-        average_angle = df['Angle'].mean()
-        top_12_angles = df[['Time', 'Angle']].to_dict(orient='records')
-
-        # Determine risk labels for each angle and find the most frequent angle within the most common risk label
-        df['RiskLabel'] = df['Angle'].apply(lambda x: determine_risk(x, config['risk_ranges']))
-        most_common_label = df['RiskLabel'].mode()[0]
-        df['Angle'] = df['Angle'].astype(int)
-        best_angle = df[df['RiskLabel'] == most_common_label]['Angle'].value_counts().idxmax()
-
-        risk_label = determine_risk(average_angle, config['risk_ranges'])
-
-        # Store the results in the database, associating them with the userUUID
-        
-        skipping_response = evaluate_performance(user_uuid, exercise_type)
-        save_results_to_db(user_uuid, exercise_type, average_angle, risk_label, float (best_angle) , top_12_angles, skipping_response['skip'])
-        return jsonify({
-            "userUUID": user_uuid,
-            "average_angle": average_angle,
-            "best_angle": float (best_angle),
-            "risk_label": risk_label,
-            "top_angles": top_12_angles,
-            "skip": skipping_response['skip'],
-            "message": skipping_response['message']
-        })
- 
-    else:
-        # Still save an error to the database if no valid angles found
-        save_results_to_db(user_uuid, exercise_type, 0.0 , "High Risk" ,0.0, [],True)
-        return jsonify({"error": "No valid angles found"})
+    try:
+        # One exercise per live session: its feedback events carry that exercise's labels
+        scorer = scorer_for(data['userUUID'], data['meta'], multi=False)
+    except UnknownExercise as e:
+        return jsonify({"error": f"Unknown exercise_type: {e.args[0]}"}), 400
+    except InvalidMeta as e:
+        return jsonify({"error": str(e)}), 400
+    session = live_sessions.create(scorer)
+    return jsonify({"sessionId": session.id, "ttl": live_sessions.ttl}), 201
+
+@app.route('/live/<session_id>/frames', methods=['POST'])
+def add_live_frames(session_id):
+    session = live_sessions.get(session_id)
+    if not session:
+        return jsonify({"error": "Unknown or expired session"}), 404
+
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"error": "Invalid JSON structure"}), 400
+    try:
+        times, points, present = decode_frames(data.get('content', []))
+    except InvalidFrames as e:
+        return jsonify({"error": str(e)}), 400
+    scorer = session.scorer
+    with session.lock:
+        accepted_indices, accepted_angles = scorer.add_points(times, points, present)
+        top_angles = [{'Time': time, 'Angle': angle} for time, angle in scorer.top_angles.items()]
+
+    risk_labels = scorer.spec.risk_scale.classify(accepted_angles)
+    angles = [{"time": times[i], "angle": angle, "risk_label": label}
+              for i, angle, label in zip(accepted_indices.tolist(), accepted_angles.tolist(), risk_labels)]
+    feedback = {
+        "angles": angles,
+        "risk_label": angles[-1]["risk_label"] if angles else None,
+        "top_angles": top_angles
+    }
+    session.publish(feedback)
+    return jsonify(feedback)
+
+@app.route('/live/<session_id>/events', methods=['GET'])
+def live_session_events(session_id):
+    session = live_sessions.get(session_id)
+    if not session:
+        return jsonify({"error": "Unknown or expired session"}), 404
+
+    subscriber = session.subscribe()
+
+    def events():
+        try:
+            while True:
+                try:
+                    event = subscriber.get(timeout=15)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+                    continue
+                if event is None:
+                    # Session ended or expired
+                    yield "event: end\ndata: {}\n\n"
+                    return
+                yield f"data: {json_codec.dumps(event)}\n\n"
+        finally:
+            session.unsubscribe(subscriber)
+
+    return Response(stream_with_context(events()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/live/<session_id>/end', methods=['POST'])
+def end_live_session(session_id):
+    session = live_sessions.pop(session_id)
+    if not session:
+        return jsonify({"error": "Unknown or expired session"}), 404
+
+    with session.lock:
+        response = session.scorer.finish()
+    session.publish(None)
+    return jsonify(response)
+
+# Cached JSON response for one of the user's read views, with ETag / If-None-Match support
+def cached_json_response(user_uuid, view, build):
+    version = get_user_version(user_uuid)
+    etag = response_cache.etag(user_uuid, view, version)
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
+
+    body = response_cache.get(user_uuid, view, version)
+    if body is None:
+        body = app.json.response(build()).get_data()
+        response_cache.put(user_uuid, view, version, body)
+    response = Response(body, mimetype=app.json.mimetype)
+    response.set_etag(etag)
+    return response
 
 @app.route('/', methods=['GET'])
 def get_calculated_data():
@@ -213,19 +830,22 @@ def get_calculated_data():
     
     if not user_uuid:
         return jsonify({"error": "Missing userUUID"}), 400
-    
+
+    return cached_json_response(user_uuid, 'results', lambda: build_calculated_data(user_uuid))
+
+def build_calculated_data(user_uuid):
     # Query the database to retrieve data for this userUUID
-    conn = sqlite3.connect('AI_DB.db')
+    conn = get_connection()
     cursor = conn.cursor()
     
     cursor.execute('''
     SELECT exercise_type, average_angle, risk_label, top_12_angles , best_angle, skip
     FROM results 
     WHERE user_uuid = ?
+    ORDER BY rowid
     ''', (user_uuid,))
     
     results = cursor.fetchall()
-    conn.close()
     
     if results:
         exercises_data = []
@@ -236,34 +856,18 @@ def get_calculated_data():
 
         for row in results:
             exercise_type, average_angle, risk_label, top_12_angles, best_angle , skip = row
-            top_12_angles = json.loads(top_12_angles)  # Convert back from JSON to Python list
+            top_12_angles = json_codec.loads(top_12_angles)  # Convert back from JSON to Python list
             
             # Extract only the angle values, ignore the time
             angle_values = [entry['Angle'] for entry in top_12_angles]
 
             # Get the risk ranges from the exercise configuration
-            config = exercise_config.get(exercise_type)
-            if config:
-                risk_ranges = config['risk_ranges']
-                angle_max = config['angle_max']
-
-                # Dynamic calculation of risk amount based on normalized value
-                exercise_risk_amounts = []
-                for angle in angle_values:
-                    if risk_ranges['low'][0] <= angle <= risk_ranges['low'][1]:
-                        # Low risk - Map to the range of 0 to 3
-                        normalized_value = (angle - risk_ranges['low'][0]) / (risk_ranges['low'][1] - risk_ranges['low'][0])
-                        exercise_risk_amounts.append(normalized_value * 3)
-                    elif risk_ranges['medium'][0] <= angle <= risk_ranges['medium'][1]:
-                        # Medium risk - Map to the range of 3 to 6
-                        normalized_value = (angle - risk_ranges['medium'][0]) / (risk_ranges['medium'][1] - risk_ranges['medium'][0])
-                        exercise_risk_amounts.append(3 + normalized_value * 3)
-                    elif risk_ranges['high'][0] <= angle <= risk_ranges['high'][1]:
-                        # High risk - Map to the range of 6 to 8
-                        normalized_value = (angle - risk_ranges['high'][0]) / (risk_ranges['high'][1] - risk_ranges['high'][0])
-                        exercise_risk_amounts.append(6 + normalized_value * 2)
-                    else:
-                        exercise_risk_amounts.append(0)  # Out of range (error case)
+            spec = EXERCISES.get(exercise_type)
+            if spec:
+                angle_max = spec.angle_max
+
+                # Risk amount of each angle: low, medium and high ranges map linearly onto 0-3, 3-6 and 6-8
+                exercise_risk_amounts = spec.risk_scale.score(angle_values).tolist()
                 if skip == "0": 
                     exercise_risk_amount = sum ( exercise_risk_amounts) / len (exercise_risk_amounts )                  
                     total_risk_amount += exercise_risk_amount  # Sum for calculating the average
@@ -299,9 +903,26 @@ def get_calculated_data():
     else:
         response = {"error": "No data found for the given userUUID"}
     
-    return jsonify(response)
+    return response
 
 
+@app.route('/history', methods=['GET'])
+def get_angle_history():
+    data = request.json
+    user_uuid = data.get('userUUID')
+
+    if not user_uuid:
+        return jsonify({"error": "Missing userUUID"}), 400
+    try:
+        exercise_type = get_exercise(data.get('exercise_type')).key
+    except UnknownExercise as e:
+        return jsonify({"error": f"Unknown exercise_type: {e.args[0]}"}), 400
+
+    # Not cached: angle rows written behind the request may land after the user's version bump
+    with stage('angle_history'):
+        history = angle_history(get_connection(), user_uuid, exercise_type)
+    return jsonify({"userUUID": user_uuid, "exercise_type": exercise_type, "history": history})
+
 @app.route('/', methods=['DELETE'])
 def delete_user():
     data = request.json
@@ -310,7 +931,7 @@ def delete_user():
     if not user_uuid:
         return jsonify({"message": "userUUID is missing"}), 200
 
-    conn_db = sqlite3.connect('AI_DB.db')
+    conn_db = get_connection()
     cursor = conn_db.cursor()
 
     # Check if the 'users' table exists
@@ -323,14 +944,23 @@ def delete_user():
     if not cursor.fetchone():
         return jsonify({"message": "Results table does not exist"}), 200
 
-    # Proceed with the deletion if tables exist
-    cursor.execute('DELETE FROM users WHERE userUUID= ?', (user_uuid,))
-    cursor.execute('DELETE FROM results WHERE user_uuid = ?', (user_uuid,))
-    cursor.execute('DELETE FROM angle_data WHERE user_uuid = ?', (user_uuid,))
-    conn_db.commit()
-
-    deleted_from_ai = cursor.rowcount > 0  # Check if any row was deleted
-    conn_db.close()
+    # Proceed with the deletion if tables exist. Angle rows still queued for the
+    # background writer are dropped once the write lock is held
+    with conn_db:
+        cursor.execute('BEGIN IMMEDIATE')
+        queued_angles = angle_writer.discard(user_uuid)
+        cursor.execute('DELETE FROM users WHERE userUUID= ?', (user_uuid,))
+        cursor.execute('DELETE FROM results WHERE user_uuid = ?', (user_uuid,))
+        cursor.execute('DELETE FROM exercise_stats WHERE user_uuid = ?', (user_uuid,))
+        cursor.execute('DELETE FROM exercise_histogram WHERE user_uuid = ?', (user_uuid,))
+        cursor.execute('DELETE FROM angle_daily_histogram WHERE user_uuid = ?', (user_uuid,))
+        cursor.execute('DELETE FROM angle_daily WHERE user_uuid = ?', (user_uuid,))
+        compacted_days = cursor.rowcount
+        cursor.execute('DELETE FROM angle_data WHERE user_uuid = ?', (user_uuid,))
+        bump_user_version(conn_db, user_uuid)
+    response_cache.invalidate(user_uuid)
+
+    deleted_from_ai = cursor.rowcount > 0 or compacted_days > 0 or queued_angles > 0  # Check if any row was deleted
 
     if deleted_from_ai:
         return jsonify({"message": "User and results deleted successfully"}), 200
@@ -348,8 +978,8 @@ def delete_results():
         #400
         return jsonify({"message": "userUUID is missing"}), 200
 
-    # Connect to the AI_DB.db to delete only from the results table
-    conn_db = sqlite3.connect('AI_DB.db')
+    # Delete only from the results table
+    conn_db = get_connection()
     cursor = conn_db.cursor()
 
     # Check if the 'results' table exists
@@ -358,14 +988,22 @@ def delete_results():
         #500
         return jsonify({"message": "Results table does not exist"}), 200
 
-    # Delete the results associated with this userUUID from the results table
-    cursor.execute('DELETE FROM results WHERE user_uuid = ?', (user_uuid,))
-    
-    deleted_from_results = cursor.rowcount > 0  # Check if any row was deleted
-    cnt=cursor.rowcount
-    cursor.execute('DELETE FROM angle_data WHERE user_uuid = ?', (user_uuid,))
-    conn_db.commit()
-    conn_db.close()
+    # Delete the results associated with this userUUID from the results table;
+    # angle rows still queued for the background writer are dropped once the write lock is held
+    with conn_db:
+        cursor.execute('BEGIN IMMEDIATE')
+        angle_writer.discard(user_uuid)
+        cursor.execute('DELETE FROM results WHERE user_uuid = ?', (user_uuid,))
+
+        deleted_from_results = cursor.rowcount > 0  # Check if any row was deleted
+        cnt=cursor.rowcount
+        cursor.execute('DELETE FROM exercise_stats WHERE user_uuid = ?', (user_uuid,))
+        cursor.execute('DELETE FROM exercise_histogram WHERE user_uuid = ?', (user_uuid,))
+        cursor.execute('DELETE FROM angle_daily_histogram WHERE user_uuid = ?', (user_uuid,))
+        cursor.execute('DELETE FROM angle_daily WHERE user_uuid = ?', (user_uuid,))
+        cursor.execute('DELETE FROM angle_data WHERE user_uuid = ?', (user_uuid,))
+        bump_user_version(conn_db, user_uuid)
+    response_cache.invalidate(user_uuid)
 
     if deleted_from_results:
         return jsonify({"Affected rows": cnt}), 200
@@ -379,7 +1017,7 @@ def delete_results():
 
 
 def fetch_user_exercises(user_uuid):
-    conn = sqlite3.connect('AI_DB.db')
+    conn = get_connection()
     cursor = conn.cursor()
     cursor.execute("""
         SELECT exercise_type, CAST(best_angle AS FLOAT)
@@ -387,101 +1025,29 @@ def fetch_user_exercises(user_uuid):
         WHERE user_uuid = ? AND skip = 0
     """, (user_uuid,))
     rows = cursor.fetchall()
-    conn.close()
     return {exercise: avg for exercise, avg in rows}
 
-correction_map = { "lateral_left_right_tilt" : "lateral_flexion" , "left_rotation" : "back_left_rotation", "right_rotation": "back_right_rotation" ,"internal_rotation_left": "hip_internal_rotation_left", 
- "internal_rotation_right": "hip_internal_rotation_right", "external_rotation_left": "hip_external_rotation_left", "external_rotation_right": "hip_external_rotation_right",
-  "knee_raise_hip_left": "knee_raise_left", "knee_raise_hip_right": "knee_raise_right","right_shoulder_vertical_flexion": "shoulder_vertical_flexion_right", "left_shoulder_vertical_flexion": "shoulder_vertical_flexion_left",
-  "right_tilt": "neck_right_tilt","left_tilt": "neck_left_tilt"}
-
-
 # === Main Summary Generator ===
 def generate_assessment_summary(user_uuid, assessment_name):
-    assessment = ASSESSMENT_CONFIG.get(assessment_name)
-    if not assessment:
+    plan = ASSESSMENT_PLANS.get(assessment_name)
+    if not plan:
         return {"error": "Invalid assessment name"}
 
-    user_data = fetch_user_exercises(user_uuid)
-    print ("User Data v1:", user_data)
-    charts_output = []
-    table_output = []
-    all_status_values = []
-
-
-    corrected_user_data = {}
-    for key, value in user_data.items():
-        new_key = correction_map.get(key, key)  
-        corrected_user_data[new_key] = value
-    user_data = corrected_user_data
-    print ("User Data:", user_data)
-
-
-    for chart in assessment["charts"]:
-        body_detail = {}
-        for part, mapped_exercises in chart["body_parts"].items():
-            # mapped_exercises = chart_to_exercises_mapping.get(part, [])
-            relevant_angles = [user_data[ex] for ex in mapped_exercises if ex in user_data]
-
-            if relevant_angles:
-                avg_angle = sum(relevant_angles) / len(relevant_angles)
-                normal_range_values = []
-                for ex in mapped_exercises:
-                    for move_key, norm in assessment["table_movements"].items():
-                        if ex == move_key:
-                            normal_range_values.append(norm)
-                if normal_range_values:
-                    avg_normal = sum(normal_range_values) / len(normal_range_values)
-                else:
-                    avg_normal = 1  
-                percent = avg_angle / avg_normal
-                if percent >= 0.75:
-                    status = "good"
-                elif percent >= 0.5:
-                    status = "fair"
-                else:
-                    status = "poor"
-            else:
-                status = "poor"
-
-            body_detail[part] = status
-            all_status_values.append(status)
-
-        charts_output.append({
-            "chart_title": chart["chart_title"],
-            "chart_type": chart["chart_type"],
-            "body_detail": body_detail
-        })
-
-    # Generate the table output based on the assessment movements
-    for movement, normal_range in assessment["table_movements"].items():
-        result_angle = user_data.get(movement, 0)
-        percent = result_angle / normal_range if normal_range > 0 else 0
-        if percent >= 0.75:
-            color = "green"
-        elif percent >= 0.5:
-            color = "orange"
-        else:
-            color = "red"
-
-        table_output.append({
-            "movment": movement,
-            "result": round(result_angle, 1),
-            "normal_range": normal_range,
-            "color": color
-        })
+    # Exercise keys are stored in canonical form, so they match the plan directly
+    with stage('fetch_user_exercises'):
+        user_data = fetch_user_exercises(user_uuid)
+    app.logger.debug("User Data: %s", user_data)
 
-    
-    from collections import Counter
-    most_common = Counter(all_status_values).most_common(1)
-    overall_status = most_common[0][0] if most_common else "poor"
+    # Charts, table and overall status from the precompiled plan
+    with stage('assessment_evaluate'):
+        evaluation = plan.evaluate(user_data)
 
     return {
         "userUUID": user_uuid,
         "assessment": assessment_name,
-        "overall": overall_status,
-        "charts": charts_output,
-        "table": table_output
+        "overall": evaluation["overall"],
+        "charts": evaluation["charts"],
+        "table": evaluation["table"]
     }
 
 # === Main API Endpoint ===
@@ -494,8 +1060,8 @@ def get_chart_assessment():
     if not user_uuid or not assessment_name:
         return jsonify({"error": "Missing userUUID or assessment"}), 400
 
-    summary = generate_assessment_summary(user_uuid, assessment_name)
-    return jsonify(summary)
+    return cached_json_response(user_uuid, f'assessment:{assessment_name}',
+                                lambda: generate_assessment_summary(user_uuid, assessment_name))
 
 
 
@@ -0,0 +1,233 @@
+"""ASGI entry point serving the routes of app.py.
+
+    uvicorn asgi:application --host 0.0.0.0 --port 5000
+
+Request bodies are read on the event loop, so a slow mobile upload holds no
+thread while it trickles in. Once the body is complete, the Flask route runs
+on a bounded thread pool. That pool does the angle work, which is NumPy and
+releases the GIL in its kernels, and the SQLite I/O on the per-thread
+connections of db.py. The routes, status codes, headers and bodies are the
+ones of app.py.
+
+Streamed sessions (application/x-ndjson) are the exception: their route starts
+at once and pulls the body from the event loop chunk by chunk, scoring frames
+while the rest is still being uploaded. Such a route holds its thread for the
+whole upload, so it runs on a pool of its own (ASGI_UPLOAD_THREADS): slow
+streamed uploads can only queue behind each other, never starve other routes.
+WebSocket connections are declined.
+"""
+import asyncio
+import contextvars
+import io
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.exceptions import ClientDisconnected
+
+from app import app
+from angle_writer import angle_writer
+
+# Threads running routes; each holds its own SQLite connection
+ASGI_WORKER_THREADS = int(os.environ.get('ASGI_WORKER_THREADS', min(32, (os.cpu_count() or 1) + 4)))
+# Threads running the routes of streamed uploads, each for as long as its upload lasts
+ASGI_UPLOAD_THREADS = int(os.environ.get('ASGI_UPLOAD_THREADS', 16))
+# Threads pulling the chunks of streamed responses (SSE events), kept apart so
+# long-lived streams cannot starve the request pool
+ASGI_STREAM_THREADS = int(os.environ.get('ASGI_STREAM_THREADS', 64))
+# Larger request bodies are refused with 413 instead of being buffered; streamed ones are never buffered
+ASGI_MAX_BODY_BYTES = int(os.environ.get('ASGI_MAX_BODY_BYTES', 100 * 1024 * 1024))
+# Content types whose body is handed to the route as it arrives, as with WSGI
+STREAMED_MIMETYPES = {'application/x-ndjson'}
+
+executor = ThreadPoolExecutor(ASGI_WORKER_THREADS, thread_name_prefix='asgi-worker')
+upload_executor = ThreadPoolExecutor(ASGI_UPLOAD_THREADS, thread_name_prefix='asgi-upload')
+stream_executor = ThreadPoolExecutor(ASGI_STREAM_THREADS, thread_name_prefix='asgi-stream')
+_DONE = object()
+
+
+class BodyTooLarge(Exception):
+    pass
+
+
+async def read_body(receive, limit=ASGI_MAX_BODY_BYTES):
+    """The whole request body, read without blocking; BodyTooLarge past `limit` bytes."""
+    chunks, size = [], 0
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return None
+        chunk = message.get('body', b'')
+        size += len(chunk)
+        if size > limit:
+            raise BodyTooLarge
+        chunks.append(chunk)
+        if not message.get('more_body', False):
+            return b''.join(chunks)
+
+
+class ReceiveStream(io.RawIOBase):
+    """A request body read by a worker thread while it arrives, each chunk awaited on the event loop."""
+
+    def __init__(self, receive, loop):
+        self._receive = receive
+        self._loop = loop
+        self._chunk = b''
+        self._done = False
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self._chunk and not self._done:
+            message = asyncio.run_coroutine_threadsafe(self._receive(), self._loop).result()
+            if message['type'] == 'http.disconnect':
+                # Not an end of body: the session must not be scored from part of it
+                raise ClientDisconnected
+            self._chunk = message.get('body', b'')
+            self._done = not message.get('more_body', False)
+        size = min(len(buffer), len(self._chunk))
+        buffer[:size] = self._chunk[:size]
+        self._chunk = self._chunk[size:]
+        return size
+
+
+def request_mimetype(scope):
+    for name, value in scope.get('headers', []):
+        if name.lower() == b'content-type':
+            return value.decode('latin-1').split(';', 1)[0].strip().lower()
+    return ''
+
+
+def wsgi_environ(scope, body):
+    """The WSGI environ of an ASGI http scope; `body` is the body read already, or a stream of it."""
+    streamed = not isinstance(body, bytes)
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0],
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body if streamed else io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    if streamed:
+        environ['wsgi.input_terminated'] = True  # the stream ends with the body, chunked or not
+    else:
+        environ['CONTENT_LENGTH'] = str(len(body))
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name == 'CONTENT_LENGTH' and not streamed:
+            continue  # the body has been read, its length is known
+        key = name if name in ('CONTENT_TYPE', 'CONTENT_LENGTH') else f'HTTP_{name}'
+        environ[key] = f'{environ[key]},{value}' if key in environ else value
+    return environ
+
+
+def _start(environ):
+    # Runs the Flask app up to its first body chunk, on a worker thread
+    started = {}
+
+    def start_response(status, headers, exc_info=None):
+        started['status'] = int(status.split(' ', 1)[0])
+        started['headers'] = [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers]
+        return lambda data: started.setdefault('written', []).append(data)
+
+    result = app(environ, start_response)
+    iterator = iter(result)
+    try:
+        first = next(iterator, _DONE)
+    except BaseException:
+        _close(result)
+        raise
+    return started, result, iterator, first
+
+
+def _close(result):
+    close = getattr(result, 'close', None)
+    if close:
+        close()
+
+
+async def _json_error(send, status, message):
+    body = app.json.dumps({"error": message}).encode() + b'\n'
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())]})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def handle_http(scope, receive, send):
+    loop = asyncio.get_running_loop()
+    if request_mimetype(scope) in STREAMED_MIMETYPES:
+        body = io.BufferedReader(ReceiveStream(receive, loop))
+        route_executor = upload_executor
+    else:
+        try:
+            body = await read_body(receive, ASGI_MAX_BODY_BYTES)
+        except BodyTooLarge:
+            await _json_error(send, 413, "Request body too large")
+            return
+        if body is None:
+            return  # client went away mid-upload
+        route_executor = executor
+
+    # Every step of the request runs in this one context, whichever thread runs it:
+    # stream_with_context keeps Flask's request context in context variables between chunks
+    context = contextvars.copy_context()
+    started, result, iterator, chunk = await loop.run_in_executor(
+        route_executor, context.run, _start, wsgi_environ(scope, body))
+    try:
+        await send({'type': 'http.response.start', 'status': started['status'], 'headers': started['headers']})
+        for data in started.get('written', []):
+            await send({'type': 'http.response.body', 'body': data, 'more_body': True})
+        while chunk is not _DONE:
+            if chunk:
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            chunk = await loop.run_in_executor(stream_executor, context.run, next, iterator, _DONE)
+        await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        # Runs the request teardown (metrics, live session unsubscribe) also when the client disconnected
+        await loop.run_in_executor(stream_executor, context.run, _close, result)
+
+
+async def handle_lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            # Write the angle rows still queued before the process exits
+            await asyncio.get_running_loop().run_in_executor(None, angle_writer.close)
+            executor.shutdown(wait=False)
+            upload_executor.shutdown(wait=False)
+            stream_executor.shutdown(wait=False)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def decline_websocket(receive, send):
+    # No route speaks WebSocket: refuse the handshake, which the server answers with 403
+    message = await receive()
+    if message['type'] == 'websocket.connect':
+        await send({'type': 'websocket.close', 'code': 1008})
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'http':
+        await handle_http(scope, receive, send)
+    elif scope['type'] == 'lifespan':
+        await handle_lifespan(receive, send)
+    elif scope['type'] == 'websocket':
+        await decline_websocket(receive, send)
+    # Other scope types are ignored: returning ends the connection
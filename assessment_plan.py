@@ -0,0 +1,111 @@
+from collections import Counter
+from dataclasses import dataclass
+
+import numpy as np
+
+from assessment_config import ASSESSMENT_CONFIG
+
+
+def _frozen(array):
+    array.setflags(write=False)
+    return array
+
+
+@dataclass(frozen=True)
+class ChartPlan:
+    chart_title: str
+    chart_type: str
+    parts: tuple            # body part names, in chart order
+    membership: np.ndarray  # (parts, exercises) 1.0 where the exercise belongs to the part
+    avg_normal: np.ndarray  # (parts,) average normal range of the part's exercises
+
+
+@dataclass(frozen=True)
+class AssessmentPlan:
+    """One ASSESSMENT_CONFIG entry compiled for evaluating users with array operations."""
+    name: str
+    exercises: tuple         # every exercise used by the charts or the table; the user vector follows this order
+    charts: tuple
+    movements: tuple         # table movements, in config order
+    movement_index: np.ndarray
+    normal_ranges: np.ndarray
+
+    def user_vector(self, user_data):
+        """The user's angle for each plan exercise, NaN where the user has none."""
+        return np.array([user_data.get(exercise, np.nan) for exercise in self.exercises], dtype=np.float64)
+
+    def evaluate(self, user_data):
+        angles = self.user_vector(user_data)
+        present = ~np.isnan(angles)
+        filled = np.where(present, angles, 0.0)
+
+        charts_output = []
+        all_status_values = []
+        for chart in self.charts:
+            counts = chart.membership @ present
+            with np.errstate(divide='ignore', invalid='ignore'):
+                percent = (chart.membership @ filled) / counts / chart.avg_normal
+            statuses = np.select([counts == 0, percent >= 0.75, percent >= 0.5], ["poor", "good", "fair"], "poor")
+            body_detail = dict(zip(chart.parts, statuses.tolist()))
+            all_status_values.extend(body_detail.values())
+            charts_output.append({
+                "chart_title": chart.chart_title,
+                "chart_type": chart.chart_type,
+                "body_detail": body_detail
+            })
+
+        results = angles[self.movement_index]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            percent = np.where(self.normal_ranges > 0, np.where(np.isnan(results), 0, results) / self.normal_ranges, 0)
+        colors = np.select([percent >= 0.75, percent >= 0.5], ["green", "orange"], "red").tolist()
+        table_output = [{
+            "movment": movement,
+            "result": 0 if np.isnan(result) else round(result, 1),
+            "normal_range": normal_range,
+            "color": color
+        } for movement, result, normal_range, color in zip(self.movements, results.tolist(),
+                                                           self.normal_ranges.tolist(), colors)]
+
+        most_common = Counter(all_status_values).most_common(1)
+        return {
+            "overall": most_common[0][0] if most_common else "poor",
+            "charts": charts_output,
+            "table": table_output
+        }
+
+
+def compile_assessment(name, assessment):
+    table_movements = assessment["table_movements"]
+    exercises = list(table_movements)
+    for chart in assessment["charts"]:
+        for mapped_exercises in chart["body_parts"].values():
+            for exercise in mapped_exercises:
+                if exercise not in exercises:
+                    exercises.append(exercise)
+    index = {exercise: i for i, exercise in enumerate(exercises)}
+
+    charts = []
+    for chart in assessment["charts"]:
+        parts = tuple(chart["body_parts"])
+        membership = np.zeros((len(parts), len(exercises)))
+        avg_normal = np.ones(len(parts))
+        for row, mapped_exercises in enumerate(chart["body_parts"].values()):
+            np.add.at(membership[row], [index[ex] for ex in mapped_exercises], 1.0)
+            normal_range_values = [table_movements[ex] for ex in mapped_exercises if ex in table_movements]
+            if normal_range_values:
+                avg_normal[row] = sum(normal_range_values) / len(normal_range_values)
+        charts.append(ChartPlan(chart["chart_title"], chart["chart_type"], parts,
+                                _frozen(membership), _frozen(avg_normal)))
+
+    return AssessmentPlan(
+        name=name,
+        exercises=tuple(exercises),
+        charts=tuple(charts),
+        movements=tuple(table_movements),
+        movement_index=_frozen(np.array([index[movement] for movement in table_movements], dtype=np.intp)),
+        normal_ranges=_frozen(np.array(list(table_movements.values()))),
+    )
+
+
+# Compiled once at import
+ASSESSMENT_PLANS = {name: compile_assessment(name, assessment) for name, assessment in ASSESSMENT_CONFIG.items()}
@@ -0,0 +1,245 @@
+"""Micro-benchmarks for the scoring hot path.
+
+    python benchmark.py [--frames 3000] [--output run.json] [--compare baseline.json]
+
+Every angle kernel (per-frame and batch), risk labelling, decoding, the top-12
+aggregation, evaluate_performance and generate_assessment_summary run on seeded
+synthetic COCO poses. Results are printed as JSON; --compare exits with status 1
+when a benchmark got slower than the baseline by more than --tolerance.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+# Neutral standing pose in normalized (x, y) image coordinates, COCO keypoint order
+NEUTRAL_POSE = np.array([
+    (0.500, 0.200), (0.510, 0.190), (0.490, 0.190), (0.525, 0.200), (0.475, 0.200),  # nose, eyes, ears
+    (0.560, 0.300), (0.440, 0.300),  # shoulders
+    (0.580, 0.420), (0.420, 0.420),  # elbows
+    (0.590, 0.530), (0.410, 0.530),  # wrists
+    (0.540, 0.550), (0.460, 0.550),  # hips
+    (0.545, 0.720), (0.455, 0.720),  # knees
+    (0.550, 0.880), (0.450, 0.880),  # ankles
+])
+HEAD = [0, 1, 2, 3, 4]
+UPPER_BODY = HEAD + [5, 6, 7, 8, 9, 10]
+FRAME_SHAPE = (720, 1280)
+FPS = 30
+
+
+def _rotate(poses, moving, pivot, radians):
+    # Rotate the `moving` keypoints of every frame around that frame's pivot point
+    cos, sin = np.cos(radians)[:, None], np.sin(radians)[:, None]
+    offset = poses[:, moving] - pivot[:, None]
+    poses[:, moving, 0] = pivot[:, None, 0] + offset[..., 0] * cos - offset[..., 1] * sin
+    poses[:, moving, 1] = pivot[:, None, 1] + offset[..., 0] * sin + offset[..., 1] * cos
+
+
+def synthetic_poses(exercise, frames, seed=0):
+    """(times, points) of a seeded recording of `exercise`: repetitions of the movement its keypoints describe.
+
+    `points` is (frames, 17, 2) with NaN for keypoints the model would have missed.
+    """
+    from exercise_registry import get_exercise
+
+    rng = np.random.default_rng([seed, sum(map(ord, exercise))])
+    keypoints = set(get_exercise(exercise).keypoints.tolist())
+    t = np.arange(frames) / FPS
+    period = rng.uniform(2.5, 4.5)
+    rep = (t // period).astype(int)
+    # One-sided exercises always move the same way; the others alternate sides between repetitions
+    direction = 1 if 'left' in exercise else -1 if 'right' in exercise else np.where(rep % 2, -1, 1)
+    # 0 -> 1 -> 0 once per repetition, with rep-to-rep variation in range
+    phase = (0.5 - 0.5 * np.cos(2 * np.pi * t / period)) * rng.uniform(0.7, 1.0, frames // int(period * FPS) + 1)[rep]
+
+    poses = np.repeat(NEUTRAL_POSE[None], frames, axis=0)
+    if keypoints & {9, 10}:
+        for elbow, wrist in [(7, 9), (8, 10)]:
+            _rotate(poses, [wrist], poses[:, elbow], direction * np.radians(150) * phase)
+    elif keypoints & {7, 8}:
+        for shoulder, arm, side in [(5, [7, 9], 1), (6, [8, 10], -1)]:
+            _rotate(poses, arm, poses[:, shoulder], -side * np.radians(rng.uniform(90, 170)) * phase)
+    if keypoints & {15, 16}:
+        for knee, ankle in [(13, 15), (14, 16)]:
+            _rotate(poses, [ankle], poses[:, knee], direction * np.radians(60) * phase)
+    elif keypoints & {13, 14}:
+        for hip, leg, side in [(11, [13, 15], 1), (12, [14, 16], -1)]:
+            _rotate(poses, leg, poses[:, hip], -side * np.radians(rng.uniform(60, 110)) * phase)
+    if 0 in keypoints:
+        shoulder_midpoint = (poses[:, 5] + poses[:, 6]) / 2
+        _rotate(poses, HEAD, shoulder_midpoint, direction * np.radians(35) * phase)
+    elif keypoints == {5, 6, 11, 12}:
+        hip_midpoint = (poses[:, 11] + poses[:, 12]) / 2
+        _rotate(poses, UPPER_BODY, hip_midpoint, direction * np.radians(rng.uniform(20, 60)) * phase)
+        # Turning the torso narrows the shoulder line seen by the camera
+        poses[:, [5, 6], 0] -= (poses[:, [5, 6], 0] - poses[:, [5, 6], 0].mean(axis=1, keepdims=True)) * (0.4 * phase[:, None])
+
+    poses += rng.normal(0, 0.003, poses.shape)  # detection jitter
+    poses[rng.random((frames, 17)) < 0.03] = np.nan  # missed keypoints
+    poses[rng.random(frames) < 0.01] = np.nan  # frames without a person
+    times = np.rint(t * 1000).astype(int).tolist()
+    return times, poses
+
+
+def as_content(times, points):
+    """The frames as the `content` list of a PATCH / request."""
+    content = []
+    for time_, pose in zip(times, points):
+        data = [{'id': i, 'x': float(x), 'y': float(y), 'score': 0.9}
+                for i, (x, y) in enumerate(pose.tolist()) if not np.isnan(x)]
+        content.append({'time': time_, 'data': data})
+    return content
+
+
+def measure(function, items, repeat):
+    """Best-of-`repeat` wall time of function(); `items` is how many frames (or calls) one run processes."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return {'items': items, 'seconds': best, 'per_second': items / best if best else float('inf')}
+
+
+def run(frames, seed, repeat, only=None):
+    # The app opens its database at import, so point it at a scratch file first
+    os.environ['AI_DB_PATH'] = os.path.join(tempfile.mkdtemp(), 'benchmark.db')
+    os.environ['ANGLE_WRITE_BEHIND'] = '0'
+    import app
+    from aggregation import TopAngles
+    from angle_functions import PoseGeometry, determine_risk
+    from config import exercise_config
+    from exercise_registry import EXERCISES
+    from keypoints import decode_frames, decode_packed, encode_packed, frames_with_keypoints
+
+    results = {}
+
+    def bench(name, function, items):
+        if only is None or only in name:
+            results[name] = measure(function, items, repeat)
+
+    recordings = {}
+    for exercise, entry in exercise_config.items():
+        spec = EXERCISES[exercise]
+        times, points = synthetic_poses(exercise, frames, seed)
+        recordings[exercise] = times, points
+        content = as_content(times, points)
+        keypoint_dicts = [{kp['id']: kp for kp in frame['data']} for frame in content]
+        usable = [kps for kps in keypoint_dicts if all(kp in kps for kp in entry['keypoints'])]
+        _, decoded, present = decode_frames(content)
+        valid = decoded[frames_with_keypoints(present, spec.keypoints)]
+
+        bench(f'kernel/{exercise}/scalar',
+              lambda f=entry['angle_function'], u=usable: [f(kps, FRAME_SHAPE) for kps in u], len(usable))
+        bench(f'kernel/{exercise}/batch', lambda f=spec.batch_function, v=valid: f(v, FRAME_SHAPE), len(valid))
+
+    times, points = recordings['back_flexion']
+    content = as_content(times, points)
+    spec = EXERCISES['back_flexion']
+    angles = np.nan_to_num(spec.batch_function(points, FRAME_SHAPE))
+    angle_list = angles.tolist()
+    meta = {'frame_shape': {'x': FRAME_SHAPE[1], 'y': FRAME_SHAPE[0]}, 'exercise_type': 'back_flexion'}
+    packed = encode_packed({'userUUID': 'benchmark', 'meta': meta}, times, points)
+
+    def all_exercises():
+        geometry = PoseGeometry(points, FRAME_SHAPE)
+        with np.errstate(invalid='ignore'):
+            for canonical in {s.key: s for s in EXERCISES.values()}.values():
+                canonical.batch_function(geometry, FRAME_SHAPE)
+
+    def top_12():
+        top_angles = TopAngles()
+        top_angles.push_many(times, angles)
+        top_angles.summary(spec.risk_scale)
+
+    def session():
+        scorer = app.SessionScorer('benchmark', 'back_flexion', FRAME_SHAPE)
+        scorer.add_frames(content)
+        scorer.top_angles.summary(spec.risk_scale)
+
+    bench('kernel/all_exercises/shared_geometry', all_exercises, frames)
+    bench('risk/determine_risk', lambda: [determine_risk(a, spec.risk_ranges) for a in angle_list], frames)
+    bench('risk/risk_scale', lambda: spec.risk_scale.classify(angles), frames)
+    bench('decode/json_frames', lambda: decode_frames(content), frames)
+    bench('decode/packed', lambda: decode_packed(packed), frames)
+    bench('aggregate/top_12', top_12, frames)
+    bench('session/decode_score_aggregate', session, frames)
+
+    # Database-backed steps, on a user with a stored result for every exercise
+    user_uuid = 'benchmark-user'
+    scorer = app.MultiExerciseScorer(user_uuid, 'all', FRAME_SHAPE)
+    for exercise, (times, points) in recordings.items():
+        if exercise in scorer.scorers:
+            present = ~np.isnan(points).any(axis=2)
+            scorer.scorers[exercise].add_points(times, points, present)
+    scorer.finish()
+
+    bench('db/evaluate_performance', lambda: app.evaluate_performance(user_uuid, 'back_flexion'), 1)
+    for assessment_name in app.ASSESSMENT_PLANS:
+        bench(f'db/assessment_summary/{assessment_name}',
+              lambda name=assessment_name: app.generate_assessment_summary(user_uuid, name), 1)
+
+    return {
+        'meta': {
+            'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'machine': platform.machine(),
+            'frames': frames,
+            'seed': seed,
+            'repeat': repeat,
+        },
+        'results': results,
+    }
+
+
+def compare(report, baseline, tolerance):
+    """Names of the benchmarks more than `tolerance` slower than in `baseline`, printed to stderr."""
+    regressions = []
+    for name, result in sorted(report['results'].items()):
+        before = baseline['results'].get(name)
+        if not before:
+            continue
+        ratio = result['per_second'] / before['per_second']
+        if ratio < 1 - tolerance:
+            regressions.append(name)
+        print(f"{name:55s} {before['per_second']:14.1f} -> {result['per_second']:14.1f}/s  x{ratio:.2f}"
+              f"{'  REGRESSION' if ratio < 1 - tolerance else ''}", file=sys.stderr)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--frames', type=int, default=3000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--only', help='run only benchmarks whose name contains this')
+    parser.add_argument('--output', help='write the JSON report here instead of stdout')
+    parser.add_argument('--compare', help='baseline JSON report to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed slowdown, as a fraction')
+    args = parser.parse_args()
+
+    report = run(args.frames, args.seed, args.repeat, args.only)
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(report, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
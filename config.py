@@ -1,4 +1,5 @@
 from angle_functions import calculate_spine_angle,calculate_external_rotation_angle, calculate_internal_rotation_angle, calculate_hip_rotation_internal_angle ,calculate_shoulder_vertical_extension ,calculate_neck_extension_angle ,calculate_lateral_flexion_angle, calculate_knee_raise_angle, calculate_vertical_flexion_angle, calculate_abduction_angle, calculate_torso_rotation_angle, calculate_hip_rotation_external_angle, calculate_neck_tilt, calculate_neck_flexion_angle
+from angle_functions import calculate_spine_angle_batch, calculate_external_rotation_angle_batch, calculate_internal_rotation_angle_batch, calculate_hip_rotation_internal_angle_batch, calculate_shoulder_vertical_extension_batch, calculate_neck_extension_angle_batch, calculate_lateral_flexion_angle_batch, calculate_knee_raise_angle_batch, calculate_vertical_flexion_angle_batch, calculate_abduction_angle_batch, calculate_torso_rotation_angle_batch, calculate_hip_rotation_external_angle_batch, calculate_neck_tilt_batch, calculate_neck_flexion_angle_batch
 
 # Configuration dictionary for exercises
 exercise_config = {
@@ -6,6 +7,7 @@ exercise_config = {
         'exercises_type':'back_flexion',
         'keypoints': [5, 6, 11, 12],
         'angle_function': lambda kp, shape: calculate_spine_angle(kp, shape, 'flexion'),
+        'batch_function': lambda points, shape: calculate_spine_angle_batch(points, shape, 'flexion'),
         'angle_max': 90,
         'angle_min' : 5,
         'movement_threshold': 20,
@@ -15,6 +17,7 @@ exercise_config = {
         'exercises_type':'back_extension',
         'keypoints': [5, 6, 11, 12],
         'angle_function': lambda kp, shape: calculate_spine_angle(kp, shape, 'extension'),
+        'batch_function': lambda points, shape: calculate_spine_angle_batch(points, shape, 'extension'),
         'angle_max': 30,
         'angle_min' : 5,
         'movement_threshold': 10,
@@ -24,6 +27,7 @@ exercise_config = {
         'exercises_type':'lateral_flexion',
         'keypoints': [5, 6, 11, 12],
         'angle_function': lambda kp, shape: calculate_lateral_flexion_angle(kp, shape),
+        'batch_function': lambda points, shape: calculate_lateral_flexion_angle_batch(points, shape),
         'angle_max': 45,
         'angle_min' : 5,
         'movement_threshold': 10,
@@ -33,6 +37,7 @@ exercise_config = {
         'exercises_type':'lateral_left_right_tilt',
         'keypoints': [5, 6, 11, 12],
         'angle_function': lambda kp, shape: calculate_lateral_flexion_angle(kp, shape),
+        'batch_function': lambda points, shape: calculate_lateral_flexion_angle_batch(points, shape),
         'angle_max': 45,
         'angle_min' : 5,
         'movement_threshold': 10,
@@ -42,6 +47,7 @@ exercise_config = {
         'exercises_type':'knee_raise_left',
         'keypoints': [11, 13],
         'angle_function': lambda kp, shape: calculate_knee_raise_angle(kp, shape, 'left'),
+        'batch_function': lambda points, shape: calculate_knee_raise_angle_batch(points, shape, 'left'),
         'angle_max': 120,
         'angle_min' : 10,
         'movement_threshold': 15,
@@ -51,6 +57,7 @@ exercise_config = {
         'exercises_type':'knee_raise_right',
         'keypoints': [12, 14],
         'angle_function': lambda kp, shape: calculate_knee_raise_angle(kp, shape, 'right'),
+        'batch_function': lambda points, shape: calculate_knee_raise_angle_batch(points, shape, 'right'),
         'angle_max': 120,
         'angle_min' : 10,
         'movement_threshold': 15,
@@ -60,6 +67,7 @@ exercise_config = {
         'exercises_type':'right_shoulder_vertical_flexion',
         'keypoints': [6, 8],
         'angle_function': lambda kp, shape: calculate_vertical_flexion_angle(kp, shape, 'right'),
+        'batch_function': lambda points, shape: calculate_vertical_flexion_angle_batch(points, shape, 'right'),
         'angle_max': 180,
         'angle_min' : 10,
         'movement_threshold': 30,
@@ -69,6 +77,7 @@ exercise_config = {
         'exercises_type':'left_shoulder_vertical_flexion',
         'keypoints': [5, 7],
         'angle_function': lambda kp, shape: calculate_vertical_flexion_angle(kp, shape, 'left'),
+        'batch_function': lambda points, shape: calculate_vertical_flexion_angle_batch(points, shape, 'left'),
         'angle_max': 180,
         'angle_min': 10,
         'movement_threshold': 30,
@@ -78,6 +87,7 @@ exercise_config = {
         'exercises_type':'shoulder_vertical_flexion_right',
         'keypoints': [6, 8],
         'angle_function': lambda kp, shape: calculate_vertical_flexion_angle(kp, shape, 'right'),
+        'batch_function': lambda points, shape: calculate_vertical_flexion_angle_batch(points, shape, 'right'),
         'angle_max': 180,
         'angle_min': 10,
         'movement_threshold': 30,
@@ -87,6 +97,7 @@ exercise_config = {
         'exercises_type':'shoulder_vertical_flexion_left',
         'keypoints': [5, 7],
         'angle_function': lambda kp, shape: calculate_vertical_flexion_angle(kp, shape, 'left'),
+        'batch_function': lambda points, shape: calculate_vertical_flexion_angle_batch(points, shape, 'left'),
         'angle_max': 180,
         'angle_min': 10,
         'movement_threshold': 30,
@@ -96,6 +107,7 @@ exercise_config = {
         'exercises_type':'shoulder_abduction',
         'keypoints': [5, 6, 8, 7],
         'angle_function': lambda kp, shape: calculate_abduction_angle(kp, shape),
+        'batch_function': lambda points, shape: calculate_abduction_angle_batch(points, shape),
         'angle_max': 180,
         'angle_min': 10,
         'movement_threshold': 30,
@@ -105,6 +117,7 @@ exercise_config = {
         'exercises_type':'left_tilt',
         'keypoints': [0, 5, 6],  # Nose, left shoulder, right shoulder
         'angle_function': lambda kp, shape: calculate_neck_tilt(kp, shape, 'left'),
+        'batch_function': lambda points, shape: calculate_neck_tilt_batch(points, shape, 'left'),
         'angle_max': 45, 
         'angle_min': 5, # Maximum angle for neck tilt
         'movement_threshold': 5,
@@ -114,6 +127,7 @@ exercise_config = {
         'exercises_type':'right_tilt',
         'keypoints': [0, 5, 6],  # Nose, left shoulder, right shoulder
         'angle_function': lambda kp, shape: calculate_neck_tilt(kp, shape, 'right'),
+        'batch_function': lambda points, shape: calculate_neck_tilt_batch(points, shape, 'right'),
         'angle_max': 45,
         'angle_min': 5,  # Maximum angle for neck tilt
         'movement_threshold': 5,
@@ -123,6 +137,7 @@ exercise_config = {
         'exercises_type':'neck_flexion',
         'keypoints': [0, 5, 6],  # Nose/Head, and shoulders
         'angle_function': lambda kp, shape: calculate_neck_flexion_angle(kp, shape),
+        'batch_function': lambda points, shape: calculate_neck_flexion_angle_batch(points, shape),
         'angle_max': 45, 
         'angle_min': 5, # Max angle for full neck flexion
         'movement_threshold': 5,  # Sensitivity to detect movement
@@ -132,6 +147,7 @@ exercise_config = {
         'exercises_type':'neck_extension',
         'keypoints': [0, 5, 6],  # Nose/Head, and shoulders
         'angle_function': lambda kp, shape: calculate_neck_extension_angle(kp, shape),
+        'batch_function': lambda points, shape: calculate_neck_extension_angle_batch(points, shape),
         'angle_max': 45,
         'angle_min': 5,  # Max angle for full neck extension
         'movement_threshold': 5,  # Sensitivity to detect movement
@@ -141,6 +157,7 @@ exercise_config = {
         'exercises_type':'shoulder_vertical_extension_left',
         'keypoints': [5, 7],  # Left shoulder and left elbow
         'angle_function': lambda kp, shape: calculate_shoulder_vertical_extension (kp, shape, 'left'),
+        'batch_function': lambda points, shape: calculate_shoulder_vertical_extension_batch(points, shape, 'left'),
         'angle_max': 90,
         'angle_min' : 10 , # Maximum angle now 90 degrees
         'movement_threshold': 15,  # Threshold for movement
@@ -154,6 +171,7 @@ exercise_config = {
         'exercises_type':'shoulder_vertical_extension_right',
         'keypoints': [6, 8],  # Right shoulder and right elbow
         'angle_function': lambda kp, shape: calculate_shoulder_vertical_extension(kp, shape, 'right'),
+        'batch_function': lambda points, shape: calculate_shoulder_vertical_extension_batch(points, shape, 'right'),
         'angle_max': 90, 
         'angle_min' : 10, # Maximum angle now 90 degrees
         'movement_threshold': 15,  # Threshold for movement
@@ -167,6 +185,7 @@ exercise_config = {
         'exercises_type':'shoulder_internal_rotation_left',
         'keypoints': [5, 7, 9],  # Left shoulder, left elbow, and left hand
         'angle_function': lambda kp, shape: calculate_internal_rotation_angle(kp, shape, 'left'),
+        'batch_function': lambda points, shape: calculate_internal_rotation_angle_batch(points, shape, 'left'),
         'angle_max': 89, 
         'angle_min' : 10, # Maximum internal rotation angle
         'movement_threshold': 10,  # Movement threshold
@@ -180,6 +199,7 @@ exercise_config = {
         'exercises_type':'shoulder_internal_rotation_right',
         'keypoints': [6, 8, 10],  # Left shoulder, left elbow, and left hand
         'angle_function': lambda kp, shape: calculate_internal_rotation_angle(kp, shape, 'right'),
+        'batch_function': lambda points, shape: calculate_internal_rotation_angle_batch(points, shape, 'right'),
         'angle_max': 89,
         'angle_min' : 10,  # Maximum internal rotation angle
         'movement_threshold': 10,  # Movement threshold
@@ -193,6 +213,7 @@ exercise_config = {
         'exercises_type':'shoulder_external_rotation_left',
         'keypoints': [5, 7, 9],  # Left shoulder, left elbow, left hand
         'angle_function': lambda kp, shape:calculate_external_rotation_angle(kp, shape, 'left'),
+        'batch_function': lambda points, shape: calculate_external_rotation_angle_batch(points, shape, 'left'),
         'angle_max': 89, 
         'angle_min' : 10, # Max angle for external rotation
         'movement_threshold': 10,
@@ -207,6 +228,7 @@ exercise_config = {
         'exercises_type':'shoulder_external_rotation_right',
         'keypoints': [6, 8, 10],  # Right shoulder, right elbow, right hand
         'angle_function': lambda kp, shape: calculate_external_rotation_angle(kp, shape, 'right'),
+        'batch_function': lambda points, shape: calculate_external_rotation_angle_batch(points, shape, 'right'),
         'angle_max': 89, 
         'angle_min' : 10, # Max angle for external rotation
         'movement_threshold': 10,
@@ -220,6 +242,7 @@ exercise_config = {
         'exercises_type':'hip_external_rotation_left',
         'keypoints': [11, 13, 15],  # Left hip, left knee, left ankle
         'angle_function': lambda kp, shape: calculate_hip_rotation_external_angle(kp, shape, 'left'),
+        'batch_function': lambda points, shape: calculate_hip_rotation_external_angle_batch(points, shape, 'left'),
         'angle_max': 89,  
         'angle_min' : 10, # حداکثر زاویه چرخش هیپ
         'movement_threshold': 10,  # حداقل مقدار تغییر زاویه برای ثبت حرکت
@@ -233,6 +256,7 @@ exercise_config = {
         'exercises_type':'hip_external_rotation_right',
         'keypoints': [12, 14, 16],  # Left hip, left knee, left ankle
         'angle_function': lambda kp, shape: calculate_hip_rotation_external_angle(kp, shape, 'right'),
+        'batch_function': lambda points, shape: calculate_hip_rotation_external_angle_batch(points, shape, 'right'),
         'angle_max': 89, 
         'angle_min' : 10, # حداکثر زاویه چرخش هیپ
         'movement_threshold': 10,  # حداقل مقدار تغییر زاویه برای ثبت حرکت
@@ -246,6 +270,7 @@ exercise_config = {
         'exercises_type':'hip_internal_rotation_left',
         'keypoints': [11, 13, 15],  # Left hip, left knee, and left ankle
         'angle_function': lambda kp, shape: calculate_hip_rotation_internal_angle(kp, shape, 'internal', 'left'),
+        'batch_function': lambda points, shape: calculate_hip_rotation_internal_angle_batch(points, shape, 'internal', 'left'),
         'angle_max': 89, 
         'angle_min' : 10, # Maximum internal rotation angle
         'movement_threshold': 10,  # Threshold to detect meaningful movement
@@ -259,6 +284,7 @@ exercise_config = {
         'exercises_type':'hip_internal_rotation_right',
         'keypoints': [12, 14, 16],  # Left hip, left knee, and left ankle
         'angle_function': lambda kp, shape: calculate_hip_rotation_internal_angle(kp, shape, 'internal', 'right'),
+        'batch_function': lambda points, shape: calculate_hip_rotation_internal_angle_batch(points, shape, 'internal', 'right'),
         'angle_max': 89,
         'angle_min': 10,  # Maximum internal rotation angle
         'movement_threshold': 10,  # Threshold to detect meaningful movement
@@ -272,6 +298,7 @@ exercise_config = {
         'exercises_type':'back_left_rotation',
         'keypoints': [5, 6, 11, 12],  # Left shoulder, right shoulder, left hip, right hip
         'angle_function': lambda kp, shape: calculate_torso_rotation_angle(kp, shape, 'left'),
+        'batch_function': lambda points, shape: calculate_torso_rotation_angle_batch(points, shape, 'left'),
         'angle_max': 90, 
         'angle_min' : 10, # Maximum rotation angle for safe range
         'movement_threshold': 10,  # Threshold to detect meaningful movement
@@ -285,6 +312,7 @@ exercise_config = {
         'exercises_type':'back_right_rotation',
         'keypoints': [5, 6, 11, 12],  # Left shoulder, right shoulder, left hip, right hip
         'angle_function': lambda kp, shape: calculate_torso_rotation_angle(kp, shape, 'right'),
+        'batch_function': lambda points, shape: calculate_torso_rotation_angle_batch(points, shape, 'right'),
         'angle_max': 90,  # Maximum rotation angle for safe range
         'angle_min' : 10,
         'movement_threshold': 10,  # Threshold to detect meaningful movement
@@ -298,6 +326,7 @@ exercise_config = {
         'exercises_type':'left_rotation',
         'keypoints': [5, 6, 11, 12],  # Left shoulder, right shoulder, left hip, right hip
         'angle_function': lambda kp, shape: calculate_torso_rotation_angle(kp, shape, 'left'),
+        'batch_function': lambda points, shape: calculate_torso_rotation_angle_batch(points, shape, 'left'),
         'angle_max': 90, 
         'angle_min' : 10, # Maximum rotation angle for safe range
         'movement_threshold': 10,  # Threshold to detect meaningful movement
@@ -311,6 +340,7 @@ exercise_config = {
         'exercises_type':'right_rotation',
         'keypoints': [5, 6, 11, 12],  # Left shoulder, right shoulder, left hip, right hip
         'angle_function': lambda kp, shape: calculate_torso_rotation_angle(kp, shape, 'right'),
+        'batch_function': lambda points, shape: calculate_torso_rotation_angle_batch(points, shape, 'right'),
         'angle_max': 90,
         'angle_min': 10,  # Maximum rotation angle for safe range
         'movement_threshold': 10,  # Threshold to detect meaningful movement
@@ -324,6 +354,7 @@ exercise_config = {
         'exercises_type':'external_rotation_left',
         'keypoints': [11, 13, 15],  # Left hip, left knee, left ankle
         'angle_function': lambda kp, shape: calculate_hip_rotation_external_angle(kp, shape, 'left'),
+        'batch_function': lambda points, shape: calculate_hip_rotation_external_angle_batch(points, shape, 'left'),
         'angle_max': 89, 
         'angle_min' : 10, # حداکثر زاویه چرخش هیپ
         'movement_threshold': 10,  # حداقل مقدار تغییر زاویه برای ثبت حرکت
@@ -337,6 +368,7 @@ exercise_config = {
         'exercises_type':'external_rotation_right',
         'keypoints': [12, 14, 16],  # Left hip, left knee, left ankle
         'angle_function': lambda kp, shape: calculate_hip_rotation_external_angle(kp, shape, 'right'),
+        'batch_function': lambda points, shape: calculate_hip_rotation_external_angle_batch(points, shape, 'right'),
         'angle_max': 89, 
         'angle_min' : 10, # حداکثر زاویه چرخش هیپ
         'movement_threshold': 10,  # حداقل مقدار تغییر زاویه برای ثبت حرکت
@@ -350,6 +382,7 @@ exercise_config = {
         'exercises_type':'internal_rotation_left',
         'keypoints': [11, 13, 15],  # Left hip, left knee, and left ankle
         'angle_function': lambda kp, shape: calculate_hip_rotation_internal_angle(kp, shape, 'internal', 'left'),
+        'batch_function': lambda points, shape: calculate_hip_rotation_internal_angle_batch(points, shape, 'internal', 'left'),
         'angle_max': 89, 
         'angle_min': 10, # Maximum internal rotation angle
         'movement_threshold': 10,  # Threshold to detect meaningful movement
@@ -363,6 +396,7 @@ exercise_config = {
         'exercises_type':'internal_rotation_right',
         'keypoints': [12, 14, 16],  # Left hip, left knee, and left ankle
         'angle_function': lambda kp, shape: calculate_hip_rotation_internal_angle(kp, shape, 'internal', 'right'),
+        'batch_function': lambda points, shape: calculate_hip_rotation_internal_angle_batch(points, shape, 'internal', 'right'),
         'angle_max': 89, 
         'angle_min': 10, # Maximum internal rotation angle
         'movement_threshold': 10,  # Threshold to detect meaningful movement
@@ -376,6 +410,7 @@ exercise_config = {
         'exercises_type':'knee_raise_hip_left',
         'keypoints': [11, 13],
         'angle_function': lambda kp, shape: calculate_knee_raise_angle(kp, shape, 'left'),
+        'batch_function': lambda points, shape: calculate_knee_raise_angle_batch(points, shape, 'left'),
         'angle_max': 120,
         'angle_min' : 10,
         'movement_threshold': 15,
@@ -385,6 +420,7 @@ exercise_config = {
         'exercises_type':'knee_raise_hip_right',
         'keypoints': [12, 14],
         'angle_function': lambda kp, shape: calculate_knee_raise_angle(kp, shape, 'right'),
+        'batch_function': lambda points, shape: calculate_knee_raise_angle_batch(points, shape, 'right'),
         'angle_max': 120,
         'angle_min' : 10,
         'movement_threshold': 15,
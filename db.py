@@ -0,0 +1,47 @@
+import os
+import sqlite3
+import threading
+
+# Database location and tuning, overridable from the environment
+DB_PATH = os.environ.get('AI_DB_PATH', 'AI_DB.db')
+BUSY_TIMEOUT_MS = int(os.environ.get('AI_DB_BUSY_TIMEOUT_MS', 5000))
+MMAP_SIZE = int(os.environ.get('AI_DB_MMAP_SIZE', 256 * 1024 * 1024))
+CACHE_SIZE_KB = int(os.environ.get('AI_DB_CACHE_SIZE_KB', 32 * 1024))
+
+# Applied to every new connection. WAL lets readers run next to a writer and
+# synchronous=NORMAL is safe with WAL (only the last commits may be lost on power loss).
+# auto_vacuum only takes effect on a new database (see retention.py for existing ones);
+# it lets the retention job hand freed pages back with incremental_vacuum.
+PRAGMAS = (
+    'PRAGMA auto_vacuum=INCREMENTAL',
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    f'PRAGMA busy_timeout={BUSY_TIMEOUT_MS}',
+    f'PRAGMA mmap_size={MMAP_SIZE}',
+    f'PRAGMA cache_size=-{CACHE_SIZE_KB}',
+    'PRAGMA temp_store=MEMORY',
+)
+
+_local = threading.local()
+
+
+def connect(path=None):
+    """Open a new connection with the serving pragmas applied."""
+    conn = sqlite3.connect(path or DB_PATH, timeout=BUSY_TIMEOUT_MS / 1000)
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+def get_connection():
+    """Return this thread's connection, opening it on first use.
+
+    Connections are kept open for the life of the thread. Use `with conn:` around
+    writes so they are committed (or rolled back) as one transaction.
+    """
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        conn = connect()
+        _local.conn = conn
+    return conn
+
@@ -0,0 +1,83 @@
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Callable
+
+import numpy as np
+
+from angle_functions import RiskScale
+from config import exercise_config
+
+# Alternative exercise keys sent by the apps, mapped to the key used in storage and assessments
+ALIASES = {
+    "lateral_left_right_tilt": "lateral_flexion",
+    "left_rotation": "back_left_rotation",
+    "right_rotation": "back_right_rotation",
+    "internal_rotation_left": "hip_internal_rotation_left",
+    "internal_rotation_right": "hip_internal_rotation_right",
+    "external_rotation_left": "hip_external_rotation_left",
+    "external_rotation_right": "hip_external_rotation_right",
+    "knee_raise_hip_left": "knee_raise_left",
+    "knee_raise_hip_right": "knee_raise_right",
+    "right_shoulder_vertical_flexion": "shoulder_vertical_flexion_right",
+    "left_shoulder_vertical_flexion": "shoulder_vertical_flexion_left",
+    "right_tilt": "neck_right_tilt",
+    "left_tilt": "neck_left_tilt",
+}
+
+
+@dataclass(frozen=True)
+class ExerciseSpec:
+    """Compiled, immutable form of one exercise_config entry."""
+    key: str                    # canonical exercise key
+    keypoints: np.ndarray       # keypoint ids that must be detected in a frame
+    angle_function: Callable    # per-frame reference: (keypoints dict, frame_shape) -> angle
+    batch_function: Callable    # (points (frames, 17, 2), frame_shape) -> angles
+    angle_min: float
+    angle_max: float
+    movement_threshold: float
+    risk_ranges: MappingProxyType
+    risk_scale: RiskScale       # vectorized labels and risk amounts for risk_ranges
+
+
+def _compile(key, entry):
+    keypoints = np.array(entry['keypoints'], dtype=np.intp)
+    keypoints.setflags(write=False)
+    return ExerciseSpec(
+        key=key,
+        keypoints=keypoints,
+        angle_function=entry['angle_function'],
+        batch_function=entry['batch_function'],
+        angle_min=entry['angle_min'],
+        angle_max=entry['angle_max'],
+        movement_threshold=entry['movement_threshold'],
+        risk_ranges=MappingProxyType(dict(entry['risk_ranges'])),
+        risk_scale=RiskScale(entry['risk_ranges']),
+    )
+
+
+def _build_registry():
+    registry = {}
+    for name, entry in exercise_config.items():
+        key = ALIASES.get(name, name)
+        # Prefer the canonical entry's settings when both names are configured
+        if key not in registry or name == key:
+            registry[key] = _compile(key, entry)
+    # Every configured name, alias or not, resolves to its canonical spec
+    for name in exercise_config:
+        registry[name] = registry[ALIASES.get(name, name)]
+    return MappingProxyType(registry)
+
+
+EXERCISES = _build_registry()
+
+
+class UnknownExercise(KeyError):
+    pass
+
+
+def get_exercise(name):
+    """The canonical spec for an exercise key or alias; UnknownExercise (a KeyError) for unknown exercises."""
+    try:
+        return EXERCISES[name]
+    except (KeyError, TypeError):
+        raise UnknownExercise(name) from None
@@ -0,0 +1,214 @@
+"""Incremental columnar export of angle_data, results and users for analytics.
+
+    python export.py OUTPUT_DIR [--format parquet|arrow] [--tables angle_data results users]
+
+Rows are streamed out of SQLite in id order, EXPORT_BATCH_ROWS at a time, into
+hive-partitioned datasets (OUTPUT_DIR/<table>/exercise_type=.../date=.../),
+readable with pyarrow.dataset, DuckDB, Spark or pandas. The ids are AUTOINCREMENT
+keys, never handed out twice, and the last exported id of every table is kept in
+OUTPUT_DIR/_watermarks.json, so the next run exports exactly the rows added since.
+Every run writes files of its own, named after a run id, and never overwrites
+earlier ones; a batch written by a run that crashed before saving its watermark is
+exported again by the next run, so readers should drop duplicate rowids. Deletions
+(DELETE /, /drop, retention) are not propagated: the export is an append-only history.
+"""
+import argparse
+import json
+import os
+import uuid
+from datetime import datetime, timezone
+
+from db import connect
+from migrations import migrate
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+except ImportError:  # optional: only needed to export
+    pa = None
+
+# Rows read from SQLite and written per batch
+EXPORT_BATCH_ROWS = int(os.environ.get('EXPORT_BATCH_ROWS', 100_000))
+WATERMARKS_FILE = '_watermarks.json'
+FORMATS = {'parquet': 'parquet', 'arrow': 'ipc'}
+
+
+def _timestamps(values):
+    # SQLite CURRENT_TIMESTAMP text, in UTC
+    parsed = pc.strptime(pa.array(values, pa.string()), format='%Y-%m-%d %H:%M:%S', unit='s', error_is_null=True)
+    return parsed.cast(pa.timestamp('s', tz='UTC'))
+
+
+def _angle_data_table(rows):
+    rowid, user_uuid, exercise_type, angle, timestamp, date = zip(*rows)
+    return pa.table({
+        'rowid': pa.array(rowid, pa.int64()),
+        'user_uuid': pa.array(user_uuid, pa.string()),
+        'angle': pa.array(angle, pa.float64()),
+        'timestamp': _timestamps(timestamp),
+        'exercise_type': pa.array(exercise_type, pa.string()),
+        'date': pa.array(date, pa.string()),
+    })
+
+
+TOP_ANGLE = pa.struct([('time', pa.float64()), ('angle', pa.float64())]) if pa else None
+
+
+def _top_angles(value):
+    # top_12_angles is stored as JSON: [{"Time": ..., "Angle": ...}, ...]
+    try:
+        return [{'time': entry.get('Time'), 'angle': entry.get('Angle')} for entry in json.loads(value)]
+    except (TypeError, ValueError, AttributeError):
+        return None
+
+
+def _float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _results_table(rows):
+    (rowid, user_uuid, exercise_type, average_angle, risk_label, best_angle, top_12_angles, skip,
+     created_at, date) = zip(*rows)
+    return pa.table({
+        'rowid': pa.array(rowid, pa.int64()),
+        'user_uuid': pa.array(user_uuid, pa.string()),
+        'average_angle': pa.array(map(_float, average_angle), pa.float64()),
+        'risk_label': pa.array(risk_label, pa.string()),
+        # best_angle and skip live in TEXT columns ('45.0', '0' / '1')
+        'best_angle': pa.array(map(_float, best_angle), pa.float64()),
+        'top_12_angles': pa.array(map(_top_angles, top_12_angles), pa.list_(TOP_ANGLE)),
+        'skip': pa.array([None if value is None else str(value) in ('1', 'True') for value in skip], pa.bool_()),
+        'created_at': _timestamps(created_at),
+        'exercise_type': pa.array(exercise_type, pa.string()),
+        'date': pa.array(date, pa.string()),
+    })
+
+
+def _users_table(rows):
+    rowid, user_id, user_uuid = zip(*rows)
+    return pa.table({
+        'rowid': pa.array(rowid, pa.int64()),
+        'user_id': pa.array(user_id, pa.string()),
+        'user_uuid': pa.array(user_uuid, pa.string()),
+    })
+
+
+# table -> (query of the rows after an id, Arrow table builder, hive partition columns);
+# rowid is the table's AUTOINCREMENT id
+TABLES = {
+    'angle_data': (
+        'SELECT rowid, user_uuid, exercise_type, angle, timestamp, date(timestamp) '
+        'FROM angle_data WHERE rowid > ? ORDER BY rowid LIMIT ?',
+        _angle_data_table, ['exercise_type', 'date'],
+    ),
+    'results': (
+        'SELECT rowid, user_uuid, exercise_type, average_angle, risk_label, best_angle, top_12_angles, skip, '
+        'created_at, date(created_at) FROM results WHERE rowid > ? ORDER BY rowid LIMIT ?',
+        _results_table, ['exercise_type', 'date'],
+    ),
+    'users': (
+        'SELECT rowid, userId, userUUID FROM users WHERE rowid > ? ORDER BY rowid LIMIT ?',
+        _users_table, [],
+    ),
+}
+
+
+def read_watermarks(output_dir):
+    try:
+        with open(os.path.join(output_dir, WATERMARKS_FILE)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def write_watermarks(output_dir, watermarks):
+    # Written to a temporary file first so a crash never leaves a truncated file behind
+    path = os.path.join(output_dir, WATERMARKS_FILE)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(watermarks, f, indent=2, sort_keys=True)
+    os.replace(path + '.tmp', path)
+
+
+def new_run_id():
+    # Sorts in the order runs started; the random part keeps concurrent runs apart
+    return f"{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')}-{uuid.uuid4().hex[:8]}"
+
+
+def _write_batch(table, base_dir, format, partition_columns, run_id, first_rowid):
+    file_format = FORMATS[format]
+    options = (ds.ParquetFileFormat() if file_format == 'parquet' else ds.IpcFileFormat()).make_write_options(
+        compression='zstd')
+    partitioning = None
+    if partition_columns:
+        partitioning = ds.partitioning(table.select(partition_columns).schema, flavor='hive')
+    # Named after the run and the batch's first id, so no file of an earlier run is ever overwritten
+    ds.write_dataset(
+        table, base_dir, format=file_format, file_options=options, partitioning=partitioning,
+        basename_template=f'part-{run_id}-{first_rowid:012d}-{{i}}.{format}',
+        existing_data_behavior='overwrite_or_ignore',
+    )
+
+
+def export_table(conn, name, output_dir, format='parquet', watermark=0, batch_rows=EXPORT_BATCH_ROWS,
+                 run_id=None):
+    """Export the rows of table `name` after id `watermark`; yields (new watermark, rows) per batch written."""
+    query, build, partition_columns = TABLES[name]
+    run_id = run_id or new_run_id()
+    last_id = conn.execute('SELECT seq FROM sqlite_sequence WHERE name = ?', (name,)).fetchone()
+    if last_id and watermark > last_id[0]:
+        # Saved before the ids were AUTOINCREMENT keys, after the newest rows were deleted:
+        # no id past the largest ever handed out has been exported
+        watermark = last_id[0]
+    while True:
+        rows = conn.execute(query, (watermark, batch_rows)).fetchall()
+        if not rows:
+            return
+        _write_batch(build(rows), os.path.join(output_dir, name), format, partition_columns, run_id, rows[0][0])
+        watermark = rows[-1][0]
+        yield watermark, len(rows)
+
+
+def export(output_dir, format='parquet', tables=tuple(TABLES), batch_rows=EXPORT_BATCH_ROWS, path=None):
+    """Export the rows added since the last run of every table in `tables`; returns {table: rows exported}."""
+    if pa is None:
+        raise RuntimeError('pyarrow is required to export: pip install pyarrow')
+    os.makedirs(output_dir, exist_ok=True)
+    watermarks = read_watermarks(output_dir)
+    run_id = new_run_id()
+    exported = {}
+    conn = connect(path)
+    try:
+        migrate(conn)
+        for name in tables:
+            exported[name] = 0
+            batches = export_table(conn, name, output_dir, format, watermarks.get(name, 0), batch_rows, run_id)
+            for watermark, rows in batches:
+                watermarks[name] = watermark
+                write_watermarks(output_dir, watermarks)
+                exported[name] += rows
+    finally:
+        conn.close()
+    return exported
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('output_dir')
+    parser.add_argument('--format', choices=sorted(FORMATS), default='parquet')
+    parser.add_argument('--tables', nargs='+', choices=list(TABLES), default=list(TABLES))
+    parser.add_argument('--batch-rows', type=int, default=EXPORT_BATCH_ROWS)
+    parser.add_argument('--db', help='database to export (default: AI_DB_PATH)')
+    args = parser.parse_args()
+    if pa is None:
+        parser.error('pyarrow is required to export: pip install pyarrow')
+
+    for name, rows in export(args.output_dir, args.format, args.tables, args.batch_rows, args.db).items():
+        print(f'{name}: {rows} rows exported')
+
+
+if __name__ == '__main__':
+    main()
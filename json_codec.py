@@ -0,0 +1,57 @@
+import json
+
+import numpy as np
+from flask.json.provider import JSONProvider
+
+try:
+    import orjson
+except ImportError:  # optional: the stdlib json module is used without it
+    orjson = None
+
+
+def _default(obj):
+    # NumPy scalars and arrays as returned by the angle functions
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+
+if orjson is not None:
+    _OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+    def dumps_bytes(obj, sort_keys=False):
+        return orjson.dumps(obj, default=_default, option=_OPTIONS | (orjson.OPT_SORT_KEYS if sort_keys else 0))
+
+    def loads(data):
+        return orjson.loads(data)
+else:
+    def dumps_bytes(obj, sort_keys=False):
+        return json.dumps(obj, default=_default, sort_keys=sort_keys, separators=(',', ':')).encode()
+
+    def loads(data):
+        return json.loads(data)
+
+
+def dumps(obj, sort_keys=False):
+    return dumps_bytes(obj, sort_keys).decode()
+
+
+class FastJSONProvider(JSONProvider):
+    """Flask JSON provider for request bodies and responses: orjson when installed, else the stdlib.
+
+    Keys are sorted as with Flask's default provider.
+    """
+    sort_keys = True
+    mimetype = 'application/json'
+
+    def dumps(self, obj, **kwargs):
+        return dumps(obj, kwargs.pop('sort_keys', self.sort_keys))
+
+    def loads(self, s, **kwargs):
+        return loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps_bytes(obj, self.sort_keys) + b'\n', mimetype=self.mimetype)
@@ -0,0 +1,194 @@
+import json
+import os
+import struct
+
+import numpy as np
+
+try:
+    import msgpack
+except ImportError:  # optional: MessagePack bodies are refused without it
+    msgpack = None
+
+# COCO pose models output 17 keypoints per person
+NUM_KEYPOINTS = 17
+
+# Frame decimation defaults; a request's meta.decimate and meta.max_fps override them
+FRAME_DECIMATION = os.environ.get('FRAME_DECIMATION', '0') == '1'
+DECIMATION_MAX_FPS = float(os.environ.get('DECIMATION_MAX_FPS', 0))  # 0: no cap
+FRAME_TIME_UNIT = float(os.environ.get('FRAME_TIME_UNIT', 0.001))  # seconds per unit of a frame's `time`
+DECIMATION_LOOKAHEAD = 8  # candidates decimate() compares each frame with before searching further
+
+# Content types of the binary alternatives to a JSON session body
+PACKED_MIMETYPE = 'application/x-keypoints'
+MSGPACK_MIMETYPES = ('application/msgpack', 'application/x-msgpack', 'application/vnd.msgpack')
+
+# Packed frame buffer, little-endian:
+#   20-byte prefix: magic b'KPT1', dtype code (1 float32, 2 int16), keypoints per frame,
+#                   2 reserved bytes, frame count (uint32), header length (uint32),
+#                   int16 quantization step (float32)
+#   header:         UTF-8 JSON {"userUUID": ..., "meta": {...}}, zero-padded to 8 bytes
+#   times:          frame count float64
+#   points:         (frames, keypoints, 2) normalized x, y; NaN (float32) or
+#                   -32768 (int16) for keypoints that were not detected
+PACKED_MAGIC = b'KPT1'
+PACKED_PREFIX = struct.Struct('<4sBBHIIf')
+PACKED_DTYPES = {1: np.dtype('<f4'), 2: np.dtype('<i2')}
+INT16_MISSING = -32768
+INT16_STEP = 1 / 16384  # covers -2..2 in steps of about 0.1 px on a 1920 px frame
+
+
+class InvalidFrames(ValueError):
+    # A session's frames are not a list of {time, data: [{id, x, y}, ...]}; answered with a 400
+    pass
+
+
+def decode_frames(content):
+    """Decode the `content` list of a PATCH request into arrays.
+
+    Returns (times, points, present): `points` is a (frames, 17, 2) float array of
+    the normalized (x, y) coordinates with NaN for missing keypoints and `present`
+    is the matching (frames, 17) validity mask. Raises InvalidFrames for malformed content.
+    """
+    if not isinstance(content, list):
+        raise InvalidFrames('content must be a list of frames')
+    times = []
+    points = np.full((len(content), NUM_KEYPOINTS, 2), np.nan)
+    present = np.zeros((len(content), NUM_KEYPOINTS), dtype=bool)
+
+    try:
+        for i, frame in enumerate(content):
+            times.append(frame.get('time'))
+            for kp in frame['data']:
+                kp_id = kp['id']
+                if 0 <= kp_id < NUM_KEYPOINTS:
+                    points[i, kp_id, 0] = kp['x']
+                    points[i, kp_id, 1] = kp['y']
+                    present[i, kp_id] = True
+    except (AttributeError, KeyError, TypeError, IndexError, ValueError):
+        raise InvalidFrames(f'content[{i}] must be a frame with a data list of keypoints with id, x and y') from None
+
+    return times, points, present
+
+
+def frames_with_keypoints(present, keypoint_ids):
+    """Mask of the frames in which every keypoint in `keypoint_ids` was detected."""
+    return present[:, keypoint_ids].all(axis=1)
+
+
+def _moved(coords, frame_times, later, earlier, threshold_sq, min_interval):
+    # Whether the frames at `later` are to be kept after the ones at `earlier` (indices or slices)
+    difference = coords[later] - coords[earlier]
+    moved = (difference * difference).sum(axis=-1).max(axis=-1) >= threshold_sq
+    if min_interval:
+        # Unknown times (NaN) never hold a frame back
+        moved &= ~(frame_times[later] - frame_times[earlier] < min_interval)
+    return moved
+
+
+def decimate(times, points, candidates, keypoint_ids, frame_shape, threshold, min_interval=0, last=None,
+             lookahead=DECIMATION_LOOKAHEAD):
+    """Mask of the frames worth keeping, and the state to pass as `last` with the next chunk.
+
+    A frame in the `candidates` mask is kept when one of `keypoint_ids` moved at least
+    `threshold` pixels since the last kept frame and, if `min_interval` is set, at least
+    that much time passed since it. `last` is the (time, pixel coordinates) of the last
+    frame kept from earlier chunks of the same session.
+
+    Every candidate is first compared with the `lookahead` candidates after it, one
+    array comparison per distance, which links it to the first of them it would keep.
+    The kept frames are then followed through those links; only from a frame with no
+    link, as at the start of a hold, are the candidates further on searched.
+    """
+    keep = np.zeros(len(times), dtype=bool)
+    indices = np.flatnonzero(candidates)
+    if not len(indices):
+        return keep, last
+    y, x = frame_shape[0], frame_shape[1]
+    coords = points[indices][:, keypoint_ids] * np.array([x, y])
+    frame_times = np.array([np.nan if times[i] is None else times[i] for i in indices.tolist()], dtype=np.float64)
+    kept = []
+    if last:
+        # Position 0 is the frame kept last by earlier chunks, position p the candidate p - 1
+        coords = np.concatenate([last[1][None], coords])
+        frame_times = np.concatenate([[last[0]], frame_times])
+    else:
+        # The session's first candidate is always kept
+        kept.append(0)
+    threshold_sq = threshold * threshold
+
+    following = np.full(len(coords), -1)
+    for distance in range(lookahead, 0, -1):
+        moved = _moved(coords, frame_times, slice(distance, None), slice(None, -distance), threshold_sq, min_interval)
+        positions = np.flatnonzero(moved)
+        following[positions] = positions + distance
+    following = following.tolist()
+
+    position = 0
+    while True:
+        successor = following[position]
+        start, size = position + lookahead + 1, 64
+        while successor < 0 and start < len(coords):
+            moved = _moved(coords, frame_times, slice(start, start + size), position, threshold_sq, min_interval)
+            if moved.any():
+                successor = start + int(moved.argmax())
+            start, size = start + size, size * 2
+        if successor < 0:
+            break
+        kept.append(successor)
+        position = successor
+
+    keep[indices[np.array(kept, dtype=np.intp) - (1 if last else 0)]] = True
+    return keep, (frame_times[position], coords[position].copy())
+
+
+def _padded(length):
+    return (length + 7) // 8 * 8
+
+
+def decode_packed(body):
+    """Decode a packed frame buffer into (header, times, points, present).
+
+    float32 points are a read-only view of `body`; int16 points are dequantized
+    into a new array. Raises ValueError for a malformed buffer.
+    """
+    if len(body) < PACKED_PREFIX.size:
+        raise ValueError('Truncated keypoint buffer')
+    magic, dtype_code, num_keypoints, _, frames, header_length, step = PACKED_PREFIX.unpack_from(body)
+    if magic != PACKED_MAGIC or dtype_code not in PACKED_DTYPES or num_keypoints != NUM_KEYPOINTS:
+        raise ValueError('Unsupported keypoint buffer')
+    dtype = PACKED_DTYPES[dtype_code]
+
+    times_offset = PACKED_PREFIX.size + _padded(header_length)
+    points_offset = times_offset + 8 * frames
+    if len(body) != points_offset + frames * num_keypoints * 2 * dtype.itemsize:
+        raise ValueError('Keypoint buffer size does not match its frame count')
+
+    header = json.loads(bytes(body[PACKED_PREFIX.size:PACKED_PREFIX.size + header_length]))
+    if not isinstance(header, dict):
+        raise ValueError('Keypoint buffer header must be a JSON object')
+    times = np.frombuffer(body, dtype='<f8', count=frames, offset=times_offset).tolist()
+    raw = np.frombuffer(body, dtype=dtype, count=frames * num_keypoints * 2,
+                        offset=points_offset).reshape(frames, num_keypoints, 2)
+    if dtype_code == 1:
+        points = raw
+        present = ~np.isnan(raw).any(axis=2)
+    else:
+        present = (raw != INT16_MISSING).all(axis=2)
+        points = np.where(present[:, :, None], raw * np.float32(step), np.float32(np.nan))
+    return header, times, points, present
+
+
+def encode_packed(header, times, points, quantize=False):
+    """Build a packed frame buffer from a header dict, frame times and (frames, 17, 2) points with NaN for missing keypoints."""
+    points = np.asarray(points, dtype=np.float64)
+    header_bytes = json.dumps(header).encode()
+    if quantize:
+        missing = np.isnan(points).any(axis=2, keepdims=True)
+        quantized = np.clip(np.rint(np.where(missing, 0, points) / INT16_STEP), INT16_MISSING + 1, 32767)
+        payload = np.where(missing, INT16_MISSING, quantized).astype('<i2')
+    else:
+        payload = points.astype('<f4')
+    prefix = PACKED_PREFIX.pack(PACKED_MAGIC, 2 if quantize else 1, NUM_KEYPOINTS, 0,
+                                len(points), len(header_bytes), INT16_STEP)
+    return b''.join([prefix, header_bytes.ljust(_padded(len(header_bytes)), b'\0'),
+                     np.asarray(times, dtype='<f8').tobytes(), payload.tobytes()])
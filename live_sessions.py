@@ -0,0 +1,82 @@
+import os
+import queue
+import threading
+import time
+import uuid
+
+# Sessions without a request for this many seconds are dropped
+LIVE_SESSION_TTL = float(os.environ.get('LIVE_SESSION_TTL', 300))
+
+
+class LiveSession:
+    """State of one live exercise session: its scorer and the feedback subscribers."""
+
+    def __init__(self, scorer):
+        self.id = str(uuid.uuid4())
+        self.scorer = scorer
+        self.lock = threading.Lock()
+        self.last_seen = time.monotonic()
+        self.subscribers = []
+
+    def publish(self, event):
+        for subscriber in list(self.subscribers):
+            try:
+                subscriber.put_nowait(event)
+            except queue.Full:
+                # A slow client misses intermediate updates rather than blocking scoring
+                pass
+
+    def subscribe(self):
+        subscriber = queue.Queue(maxsize=256)
+        self.subscribers.append(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        if subscriber in self.subscribers:
+            self.subscribers.remove(subscriber)
+
+
+class LiveSessionStore:
+    """In-memory live sessions with TTL eviction.
+
+    Sessions live in the worker process that created them, so live clients need
+    a single worker or sticky routing.
+    """
+
+    def __init__(self, ttl=LIVE_SESSION_TTL):
+        self.ttl = ttl
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def create(self, scorer):
+        session = LiveSession(scorer)
+        with self._lock:
+            self._evict_expired()
+            self._sessions[session.id] = session
+        return session
+
+    def get(self, session_id):
+        with self._lock:
+            self._evict_expired()
+            session = self._sessions.get(session_id)
+            if session:
+                session.last_seen = time.monotonic()
+            return session
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def queued_events(self):
+        # Feedback events waiting in subscriber queues, across all sessions
+        with self._lock:
+            return sum(subscriber.qsize() for session in self._sessions.values() for subscriber in session.subscribers)
+
+    def pop(self, session_id):
+        with self._lock:
+            return self._sessions.pop(session_id, None)
+
+    def _evict_expired(self):
+        deadline = time.monotonic() - self.ttl
+        for session_id in [key for key, session in self._sessions.items() if session.last_seen < deadline]:
+            # Abandoned sessions are discarded without persisting a result
+            self._sessions.pop(session_id).publish(None)
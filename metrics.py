@@ -0,0 +1,151 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# Prometheus text exposition format
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Registry:
+    """The metrics of this process, rendered by /metrics.
+
+    Every worker process keeps its own values, so scrape each worker (or run one).
+    """
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            lines.extend(metric.samples())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+
+class _Metric:
+    kind = 'untyped'
+
+    def __init__(self, name, documentation, labelnames=(), registry=REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        registry.register(self)
+
+    def _labels(self, values, extra=()):
+        pairs = list(zip(self.labelnames, values)) + list(extra)
+        if not pairs:
+            return ''
+        return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values = {}
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f'{self.name}{self._labels(labels)} {_format(value)}' for labels, value in values]
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, *args, buckets=DEFAULT_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(buckets)
+        self._values = {}  # labels -> [per-bucket counts (last is +Inf), sum]
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    @contextmanager
+    def time(self, *labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def samples(self):
+        with self._lock:
+            values = sorted((labels, list(counts), total) for labels, (counts, total) in self._values.items())
+        lines = []
+        for labels, counts, total in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{self._labels(labels, [("le", _format(bound))])} {cumulative}')
+            lines.append(f'{self.name}_sum{self._labels(labels)} {_format(total)}')
+            lines.append(f'{self.name}_count{self._labels(labels)} {cumulative}')
+        return lines
+
+
+class Gauge(_Metric):
+    """A value read when metrics are scraped: `function` returns a number, or a dict of label tuples to numbers."""
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, function, labelnames=(), registry=REGISTRY):
+        super().__init__(name, documentation, labelnames, registry)
+        self.function = function
+
+    def samples(self):
+        value = self.function()
+        values = sorted(value.items()) if isinstance(value, dict) else [((), value)]
+        return [f'{self.name}{self._labels(labels)} {_format(value)}' for labels, value in values]
+
+
+REQUEST_SECONDS = Histogram('ai_http_request_duration_seconds', 'Time spent handling HTTP requests.',
+                            ['route', 'method', 'status'])
+STAGE_SECONDS = Histogram('ai_stage_duration_seconds', 'Time spent in each stage of an endpoint.',
+                          ['endpoint', 'stage'])
+FRAMES_RECEIVED = Counter('ai_frames_received_total', 'Frames received for scoring.', ['exercise_type'])
+FRAMES_ACCEPTED = Counter('ai_frames_accepted_total', 'Frames whose angle was within the exercise limits.',
+                          ['exercise_type'])
+FRAMES_REJECTED = Counter('ai_frames_rejected_total',
+                          'Frames without the keypoints or with an angle outside the exercise limits.',
+                          ['exercise_type'])
+FRAMES_DECIMATED = Counter('ai_frames_decimated_total',
+                           'Accepted frames not stored because of decimation (too little movement or above the fps cap).',
+                           ['exercise_type'])
+SQLITE_WAIT_SECONDS = Histogram('ai_sqlite_lock_wait_seconds', 'Time spent waiting for the SQLite write lock.',
+                                ['operation'])
+ANGLE_WRITER_BATCH_SECONDS = Histogram('ai_angle_writer_batch_seconds',
+                                       'Time the background writer spent writing one batch of angle_data rows.')
+ANGLE_WRITER_ROWS = Counter('ai_angle_writer_rows_total', 'angle_data rows handled by the background writer.',
+                            ['outcome'])
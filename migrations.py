@@ -0,0 +1,292 @@
+import os
+
+from config import exercise_config
+from db import get_connection
+from exercise_registry import ALIASES
+
+# Schema migrations, applied in order. The index of the last applied migration
+# is kept in PRAGMA user_version, so each one runs exactly once per database.
+#
+# Some migrations backfill or rebuild whole tables (v2, v7) and hold the write
+# lock until they are done, about 2 s per million angle_data rows for v7: on a
+# large database that takes minutes, during which every write waits. Upgrade
+# such a database out of band, before starting the new version, with
+# `python migrations.py`. Workers that start meanwhile wait up to
+# AI_DB_MIGRATION_BUSY_TIMEOUT_MS for the migration instead of failing on boot.
+
+MIGRATION_BUSY_TIMEOUT_MS = int(os.environ.get('AI_DB_MIGRATION_BUSY_TIMEOUT_MS', 30 * 60 * 1000))
+
+
+def _v1_base_schema(cursor):
+    # Tables that used to be created lazily on every write
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS users (
+        userId TEXT PRIMARY KEY,
+        userUUID TEXT NOT NULL
+    )
+    ''')
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS angle_data (
+        user_uuid TEXT,
+        exercise_type TEXT,
+        angle REAL,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS results (
+        user_uuid TEXT,
+        exercise_type TEXT,
+        average_angle REAL,
+        risk_label TEXT,
+        best_angle TEXT,
+        top_12_angles TEXT,
+        skip TEXT
+    )
+    ''')
+    # Indexes for the per-user lookups done on every request
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_users_uuid ON users (userUUID)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_angle_data_user_exercise_time '
+                   'ON angle_data (user_uuid, exercise_type, timestamp)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_results_user_skip ON results (user_uuid, skip)')
+
+
+def _v2_exercise_stats(cursor):
+    # Running per-(user, exercise) aggregate read by evaluate_performance, plus a
+    # 1-degree angle histogram so the skip ratio can be rebased on a new angle_min
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS exercise_stats (
+        user_uuid TEXT NOT NULL,
+        exercise_type TEXT NOT NULL,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        below_min INTEGER NOT NULL DEFAULT 0,
+        angle_min REAL,
+        PRIMARY KEY (user_uuid, exercise_type)
+    )
+    ''')
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS exercise_histogram (
+        user_uuid TEXT NOT NULL,
+        exercise_type TEXT NOT NULL,
+        bin INTEGER NOT NULL,
+        count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (user_uuid, exercise_type, bin)
+    )
+    ''')
+
+    # Backfill from the raw angles already stored
+    cursor.execute('''
+    INSERT OR IGNORE INTO exercise_histogram (user_uuid, exercise_type, bin, count)
+    SELECT user_uuid, exercise_type, CAST(angle AS INTEGER), COUNT(*)
+    FROM angle_data
+    GROUP BY user_uuid, exercise_type, CAST(angle AS INTEGER)
+    ''')
+    cursor.execute('SELECT DISTINCT exercise_type FROM angle_data')
+    for (exercise_type,) in cursor.fetchall():
+        angle_min = exercise_config[exercise_type]['angle_min'] if exercise_type in exercise_config else None
+        cursor.execute('''
+        INSERT OR IGNORE INTO exercise_stats (user_uuid, exercise_type, attempts, below_min, angle_min)
+        SELECT user_uuid, exercise_type, COUNT(*), COALESCE(SUM(angle < ?), 0), ?
+        FROM angle_data
+        WHERE exercise_type = ?
+        GROUP BY user_uuid
+        ''', (angle_min, angle_min, exercise_type))
+
+
+def _v3_user_versions(cursor):
+    # Per-user data version, bumped by every write; cached responses and their ETags are tied to it
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS user_versions (
+        user_uuid TEXT PRIMARY KEY,
+        version INTEGER NOT NULL
+    )
+    ''')
+
+
+def _v4_canonical_exercise_keys(cursor):
+    # Rows used to be stored under whatever exercise alias the app sent; store the canonical key
+    for alias, key in ALIASES.items():
+        for table in ('angle_data', 'results'):
+            cursor.execute(f'UPDATE {table} SET exercise_type = ? WHERE exercise_type = ?', (key, alias))
+        cursor.execute('''
+        INSERT INTO exercise_histogram (user_uuid, exercise_type, bin, count)
+        SELECT user_uuid, ?, bin, count FROM exercise_histogram WHERE exercise_type = ?
+        ON CONFLICT (user_uuid, exercise_type, bin) DO UPDATE SET count = count + excluded.count
+        ''', (key, alias))
+        cursor.execute('''
+        INSERT INTO exercise_stats (user_uuid, exercise_type, attempts, below_min, angle_min)
+        SELECT user_uuid, ?, attempts, below_min, angle_min FROM exercise_stats WHERE exercise_type = ?
+        ON CONFLICT (user_uuid, exercise_type) DO UPDATE SET
+            attempts = attempts + excluded.attempts,
+            below_min = below_min + excluded.below_min
+        ''', (key, alias))
+        cursor.execute('DELETE FROM exercise_histogram WHERE exercise_type = ?', (alias,))
+        cursor.execute('DELETE FROM exercise_stats WHERE exercise_type = ?', (alias,))
+    # Responses cached by clients may still show the old keys
+    cursor.execute('UPDATE user_versions SET version = version + 1')
+
+
+def _v5_angle_daily(cursor):
+    # Compacted tier of angle_data, filled by retention.py: one row per (user, exercise, day)
+    # with the mean kept as angle_sum / count so days can be merged, and a 1-degree histogram
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS angle_daily (
+        user_uuid TEXT NOT NULL,
+        exercise_type TEXT NOT NULL,
+        day TEXT NOT NULL,
+        count INTEGER NOT NULL,
+        angle_min REAL,
+        angle_max REAL,
+        angle_sum REAL,
+        PRIMARY KEY (user_uuid, exercise_type, day)
+    )
+    ''')
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS angle_daily_histogram (
+        user_uuid TEXT NOT NULL,
+        exercise_type TEXT NOT NULL,
+        day TEXT NOT NULL,
+        bin INTEGER NOT NULL,
+        count INTEGER NOT NULL,
+        PRIMARY KEY (user_uuid, exercise_type, day, bin)
+    )
+    ''')
+
+
+def _v6_results_created_at(cursor):
+    # When a result was stored, for date-partitioned exports; NULL for results stored before this
+    cursor.execute('ALTER TABLE results ADD COLUMN created_at TEXT')
+
+
+def _v7_autoincrement_keys(cursor):
+    # Strictly increasing keys for the incremental export: the rowids of deleted rows are
+    # handed out again, AUTOINCREMENT ids never are. The tables are rebuilt, every row
+    # keeping its rowid as id.
+    tables = {
+        'users': ('''
+        CREATE TABLE users_v7 (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            userId TEXT UNIQUE,
+            userUUID TEXT NOT NULL
+        )
+        ''', 'userId, userUUID'),
+        'angle_data': ('''
+        CREATE TABLE angle_data_v7 (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_uuid TEXT,
+            exercise_type TEXT,
+            angle REAL,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+        ''', 'user_uuid, exercise_type, angle, timestamp'),
+        'results': ('''
+        CREATE TABLE results_v7 (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_uuid TEXT,
+            exercise_type TEXT,
+            average_angle REAL,
+            risk_label TEXT,
+            best_angle TEXT,
+            top_12_angles TEXT,
+            skip TEXT,
+            created_at TEXT
+        )
+        ''', 'user_uuid, exercise_type, average_angle, risk_label, best_angle, top_12_angles, skip, created_at'),
+    }
+    for table, (create, columns) in tables.items():
+        cursor.execute(create)
+        cursor.execute(f'INSERT INTO {table}_v7 (id, {columns}) SELECT rowid, {columns} FROM {table}')
+        cursor.execute(f'DROP TABLE {table}')
+        cursor.execute(f'ALTER TABLE {table}_v7 RENAME TO {table}')
+    # The indexes were dropped with the old tables
+    cursor.execute('CREATE INDEX idx_users_uuid ON users (userUUID)')
+    cursor.execute('CREATE INDEX idx_angle_data_user_exercise_time ON angle_data (user_uuid, exercise_type, timestamp)')
+    cursor.execute('CREATE INDEX idx_results_user_skip ON results (user_uuid, skip)')
+
+
+def _v8_results_user_index(cursor):
+    # GET / lists a user's results in the order they were stored; (user_uuid, skip) would group them by skip
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_results_user ON results (user_uuid)')
+
+
+MIGRATIONS = [
+    _v1_base_schema,
+    _v2_exercise_stats,
+    _v3_user_versions,
+    _v4_canonical_exercise_keys,
+    _v5_angle_daily,
+    _v6_results_created_at,
+    _v7_autoincrement_keys,
+    _v8_results_user_index,
+]
+
+
+def migrate(conn=None):
+    """Bring the database schema up to the latest version; returns that version."""
+    conn = conn or get_connection()
+    busy_timeout = conn.execute('PRAGMA busy_timeout').fetchone()[0]
+    # BEGIN IMMEDIATE takes the write lock first, so concurrent workers starting
+    # up together apply each migration once; the others wait for it to finish
+    conn.execute(f'PRAGMA busy_timeout = {MIGRATION_BUSY_TIMEOUT_MS}')
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            cursor = conn.cursor()
+            version = cursor.execute('PRAGMA user_version').fetchone()[0]
+            for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+                migration(cursor)
+                cursor.execute(f'PRAGMA user_version = {number}')
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+    finally:
+        conn.execute(f'PRAGMA busy_timeout = {busy_timeout}')
+    return len(MIGRATIONS)
+
+
+# Queries on the request path; each must be answered through an index
+HOT_QUERIES = {
+    'get_user_uuid_from_db': ('SELECT userUUID FROM users WHERE userId = ?', ('u',)),
+    'get_calculated_data': ('SELECT exercise_type, average_angle, risk_label, top_12_angles, best_angle, skip '
+                            'FROM results WHERE user_uuid = ? ORDER BY rowid', ('u',)),
+    'exercise_stats': ('SELECT attempts, below_min, angle_min FROM exercise_stats '
+                       'WHERE user_uuid = ? AND exercise_type = ?', ('u', 'e')),
+    'exercise_histogram': ('SELECT COALESCE(SUM(count), 0) FROM exercise_histogram '
+                           'WHERE user_uuid = ? AND exercise_type = ? AND bin < ?', ('u', 'e', 10)),
+    'exercise_stats_rebase': ('UPDATE exercise_stats SET angle_min = ?, below_min = ('
+                              'SELECT COALESCE(SUM(count), 0) FROM exercise_histogram h '
+                              'WHERE h.user_uuid = exercise_stats.user_uuid '
+                              'AND h.exercise_type = exercise_stats.exercise_type AND h.bin < ?) - ? '
+                              'WHERE user_uuid = ? AND exercise_type = ? AND angle_min IS NOT ?',
+                              (5, 5, 0, 'u', 'e', 5)),
+    'user_versions': ('SELECT version FROM user_versions WHERE user_uuid = ?', ('u',)),
+    'fetch_user_exercises': ('SELECT exercise_type, CAST(best_angle AS FLOAT) FROM results '
+                             'WHERE user_uuid = ? AND skip = 0', ('u',)),
+    'delete_users': ('DELETE FROM users WHERE userUUID = ?', ('u',)),
+    'delete_results': ('DELETE FROM results WHERE user_uuid = ?', ('u',)),
+    'delete_angle_data': ('DELETE FROM angle_data WHERE user_uuid = ?', ('u',)),
+    'delete_exercise_stats': ('DELETE FROM exercise_stats WHERE user_uuid = ?', ('u',)),
+    'delete_exercise_histogram': ('DELETE FROM exercise_histogram WHERE user_uuid = ?', ('u',)),
+    'delete_angle_daily': ('DELETE FROM angle_daily WHERE user_uuid = ?', ('u',)),
+    'delete_angle_daily_histogram': ('DELETE FROM angle_daily_histogram WHERE user_uuid = ?', ('u',)),
+    'angle_history_daily': ('SELECT day, count, angle_min, angle_max, angle_sum FROM angle_daily '
+                            'WHERE user_uuid = ? AND exercise_type = ? ORDER BY day', ('u', 'e')),
+}
+
+
+def unindexed_queries(conn=None):
+    """Return {name: plan} for every hot query whose EXPLAIN QUERY PLAN scans or sorts instead of seeking an index."""
+    conn = conn or get_connection()
+    offenders = {}
+    for name, (sql, params) in HOT_QUERIES.items():
+        plan = [row[3] for row in conn.execute('EXPLAIN QUERY PLAN ' + sql, params)]
+        if any(step.startswith('SCAN') or 'TEMP B-TREE' in step for step in plan):
+            offenders[name] = plan
+    return offenders
+
+
+if __name__ == '__main__':
+    print('Schema version:', migrate())
+    for name, plan in unindexed_queries().items():
+        print('Not indexed:', name, plan)
@@ -0,0 +1,120 @@
+import atexit
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from angle_functions import PoseGeometry
+from exercise_registry import get_exercise
+
+logger = logging.getLogger(__name__)
+
+# Opt-in process pool for the angle kernels of very large uploads, overridable from the environment
+PARALLEL_ANGLES = os.environ.get('PARALLEL_ANGLES', '0') == '1'
+PARALLEL_WORKERS = int(os.environ.get('PARALLEL_WORKERS', os.cpu_count() or 1))
+# Uploads with fewer frames are scored in-process: below this, start-up and copies cost more than they save
+PARALLEL_MIN_FRAMES = int(os.environ.get('PARALLEL_MIN_FRAMES', 20_000))
+PARALLEL_CHUNK_FRAMES = int(os.environ.get('PARALLEL_CHUNK_FRAMES', 8192))
+
+
+def _score_chunk(points_name, points_shape, points_dtype, angles_name, exercise_keys, frame_shape, start, stop):
+    # Runs in a pool process: reads frames [start, stop) and writes their angles, both in shared memory
+    points_block = shared_memory.SharedMemory(name=points_name)
+    angles_block = shared_memory.SharedMemory(name=angles_name)
+    points = angles = None
+    try:
+        points = np.ndarray(points_shape, dtype=points_dtype, buffer=points_block.buf)
+        angles = np.ndarray((len(exercise_keys), points_shape[0]), dtype=np.float64, buffer=angles_block.buf)
+        _score(points[start:stop], exercise_keys, frame_shape, angles[:, start:stop])
+    finally:
+        points = angles = None  # the blocks cannot be closed while arrays still use them
+        points_block.close()
+        angles_block.close()
+
+
+def _score(points, exercise_keys, frame_shape, out):
+    # Frames missing an exercise's keypoints get NaN, as with a shared PoseGeometry
+    geometry = PoseGeometry(points, frame_shape)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for row, key in enumerate(exercise_keys):
+            out[row] = get_exercise(key).batch_function(geometry, frame_shape)
+
+
+class AnglePool:
+    """Computes the angles of very large frame batches across a pool of processes.
+
+    The frames are copied once into a shared memory block and each process scores
+    PARALLEL_CHUNK_FRAMES of them at a time, writing the angles into a second block,
+    so neither is pickled. Processes look the angle functions up by exercise key.
+    The pool is started on first use, with forkserver (or spawn) rather than fork,
+    since the serving process runs threads.
+    """
+
+    def __init__(self, workers=PARALLEL_WORKERS, min_frames=PARALLEL_MIN_FRAMES, chunk_frames=PARALLEL_CHUNK_FRAMES):
+        self.workers = workers
+        self.min_frames = min_frames
+        self.chunk_frames = chunk_frames
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def accepts(self, frames):
+        return PARALLEL_ANGLES and self.workers > 1 and frames >= self.min_frames
+
+    def compute(self, exercise_keys, points, frame_shape):
+        """{exercise key: angle of every frame}, NaN where a frame lacks the exercise's keypoints."""
+        exercise_keys = list(exercise_keys)
+        points = np.ascontiguousarray(points)
+        frames = len(points)
+        points_block = shared_memory.SharedMemory(create=True, size=max(points.nbytes, 1))
+        angles_block = shared_memory.SharedMemory(create=True, size=max(len(exercise_keys) * frames * 8, 1))
+        shared_points = angles = None
+        try:
+            shared_points = np.ndarray(points.shape, dtype=points.dtype, buffer=points_block.buf)
+            shared_points[...] = points
+            angles = np.ndarray((len(exercise_keys), frames), dtype=np.float64, buffer=angles_block.buf)
+            try:
+                futures = [
+                    self._pool().submit(_score_chunk, points_block.name, points.shape, points.dtype.str,
+                                        angles_block.name, exercise_keys, frame_shape,
+                                        start, min(start + self.chunk_frames, frames))
+                    for start in range(0, frames, self.chunk_frames)
+                ]
+                for future in futures:
+                    future.result()
+            except BrokenProcessPool:
+                # A process died (e.g. killed for memory): score here and start a new pool next time
+                logger.exception('Angle process pool broke, scoring %d frames in-process', frames)
+                self._reset()
+                _score(points, exercise_keys, frame_shape, angles)
+            return {key: angles[row].copy() for row, key in enumerate(exercise_keys)}
+        finally:
+            shared_points = angles = None  # the blocks cannot be closed while arrays still use them
+            for block in (points_block, angles_block):
+                block.close()
+                block.unlink()
+
+    def close(self):
+        self._reset(wait=True)
+
+    def _pool(self):
+        with self._lock:
+            if self._executor is None:
+                methods = multiprocessing.get_all_start_methods()
+                context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+                self._executor = ProcessPoolExecutor(self.workers, mp_context=context)
+            return self._executor
+
+    def _reset(self, wait=False):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
+
+
+angle_pool = AnglePool()
+atexit.register(angle_pool.close)
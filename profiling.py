@@ -0,0 +1,184 @@
+import cProfile
+import io
+import marshal
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+# Sampling interval of the stack sampler, in seconds
+SAMPLE_INTERVAL = float(os.environ.get('PROFILE_SAMPLE_INTERVAL', 0.005))
+
+
+class ProfileRun:
+    """One profiling run: which requests it covers and what it has collected so far."""
+
+    def __init__(self, rule, method, mode, requests, seconds, interval):
+        self.rule = rule
+        self.method = method
+        self.mode = mode                # 'cprofile' or 'sample'
+        self.remaining = requests       # None: no request limit
+        self.deadline = time.monotonic() + seconds if seconds else None
+        self.interval = interval
+        self.started_at = time.time()
+        self.profiled = 0
+        self.skipped = 0
+        self.stats = None               # pstats.Stats of the cProfile runs
+        self.samples = Counter()        # collapsed stack -> samples
+        self.threads = set()            # idents of the threads currently serving a profiled request
+        self.stopped = False
+
+    def accepts(self, rule, method):
+        if self.stopped or rule != self.rule or (self.method and method != self.method):
+            return False
+        if self.deadline is not None and time.monotonic() > self.deadline:
+            return False
+        return self.remaining is None or self.remaining > 0
+
+    @property
+    def finished(self):
+        expired = self.deadline is not None and time.monotonic() > self.deadline
+        return self.stopped or ((expired or self.remaining == 0) and not self.threads)
+
+    def status(self):
+        return {
+            "route": self.rule,
+            "method": self.method,
+            "mode": self.mode,
+            "started_at": self.started_at,
+            "remaining_requests": self.remaining,
+            "remaining_seconds": max(0.0, self.deadline - time.monotonic()) if self.deadline else None,
+            "profiled_requests": self.profiled,
+            "skipped_requests": self.skipped,
+            "finished": self.finished,
+        }
+
+
+class RequestProfiler:
+    """Profiles the next requests to one route, on demand.
+
+    'cprofile' mode runs cProfile around each matching request and merges the
+    results into one pstats.Stats. 'sample' mode records the stacks of the threads
+    serving matching requests every `interval` seconds, for collapsed-stack
+    flamegraphs, at a much lower overhead.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._run = None
+
+    def start(self, rule, method=None, mode='cprofile', requests=None, seconds=None, interval=SAMPLE_INTERVAL):
+        if mode not in ('cprofile', 'sample'):
+            raise ValueError(f'Unknown profiling mode: {mode}')
+        if not requests and not seconds:
+            raise ValueError('Give a number of requests, a number of seconds or both')
+        run = ProfileRun(rule, method, mode, requests, seconds, interval)
+        with self._lock:
+            if self._run:
+                self._run.stopped = True
+            self._run = run
+        if mode == 'sample':
+            threading.Thread(target=self._sample, args=(run,), name='profile-sampler', daemon=True).start()
+        return run.status()
+
+    def stop(self):
+        with self._lock:
+            if self._run:
+                self._run.stopped = True
+                return self._run.status()
+        return None
+
+    def status(self):
+        with self._lock:
+            return self._run.status() if self._run else None
+
+    def begin(self, rule, method):
+        """Called when a request starts; returns a token for end(), or None if it is not profiled."""
+        run = self._run
+        if run is None or not run.accepts(rule, method):
+            return None
+        with self._lock:
+            if not run.accepts(rule, method):
+                return None
+            if run.remaining is not None:
+                run.remaining -= 1
+            if run.mode == 'sample':
+                run.threads.add(threading.get_ident())
+                return run, None
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Python 3.12+ allows a single active profiler: overlapping requests are skipped
+            with self._lock:
+                run.skipped += 1
+            return None
+        return run, profile
+
+    def end(self, token):
+        if token is None:
+            return
+        run, profile = token
+        if profile is not None:
+            profile.disable()
+        with self._lock:
+            run.profiled += 1
+            if profile is None:
+                run.threads.discard(threading.get_ident())
+            elif run.stats is None:
+                run.stats = pstats.Stats(profile)
+            else:
+                run.stats.add(profile)
+
+    def _sample(self, run):
+        while not run.finished:
+            time.sleep(run.interval)
+            frames = sys._current_frames()
+            with self._lock:
+                threads = list(run.threads)
+            stacks = []
+            for ident in threads:
+                frame = frames.get(ident)
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+                    frame = frame.f_back
+                if stack:
+                    stacks.append(';'.join(reversed(stack)))
+            del frames
+            with self._lock:
+                run.samples.update(stacks)
+
+    def report(self, output='text', sort='cumulative', limit=50):
+        """The collected profile: pstats text, marshalled pstats data or collapsed stacks."""
+        with self._lock:
+            run = self._run
+            if run is None:
+                return None
+            if output == 'collapsed':
+                return ''.join(f'{stack} {count}\n' for stack, count in run.samples.most_common())
+            if run.stats is None:
+                return b'' if output == 'pstats' else ''
+            if output == 'pstats':
+                # Readable with pstats.Stats(path) once written to a file
+                return marshal.dumps(run.stats.stats)
+            stream = io.StringIO()
+            stats = pstats.Stats(stream=stream)
+            stats.add(run.stats)
+            stats.sort_stats(sort).print_stats(limit)
+            return stream.getvalue()
+
+
+def tracemalloc_snapshot(limit=25, key_type='lineno'):
+    """Top allocations of the current tracemalloc trace, as text; None if tracing is off."""
+    if not tracemalloc.is_tracing():
+        return None
+    current, peak = tracemalloc.get_traced_memory()
+    lines = [f'traced memory: current {current / 1024:.1f} KiB, peak {peak / 1024:.1f} KiB']
+    for statistic in tracemalloc.take_snapshot().statistics(key_type)[:limit]:
+        lines.append(str(statistic))
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,67 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# Cache size and lifetime, overridable from the environment
+RESPONSE_CACHE_MAX_ENTRIES = int(os.environ.get('RESPONSE_CACHE_MAX_ENTRIES', 4096))
+RESPONSE_CACHE_TTL = float(os.environ.get('RESPONSE_CACHE_TTL', 300))
+
+
+class ResponseCache:
+    """Encoded response bodies keyed by (userUUID, view), valid for one data version.
+
+    The version is the user's counter in the user_versions table, bumped by every
+    write to that user's data. Entries are evicted least-recently-used first and
+    after RESPONSE_CACHE_TTL seconds.
+    """
+
+    def __init__(self, max_entries=RESPONSE_CACHE_MAX_ENTRIES, ttl=RESPONSE_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # (user_uuid, view) -> (version, stored_at, body), in LRU order
+        self._views = {}  # user_uuid -> set of that user's cached views, so invalidate() needs no scan
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def etag(user_uuid, view, version):
+        return hashlib.sha1(f'{user_uuid}:{view}:{version}'.encode()).hexdigest()[:20]
+
+    def get(self, user_uuid, view, version):
+        key = (user_uuid, view)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            cached_version, stored_at, body = entry
+            if cached_version != version or time.monotonic() - stored_at > self.ttl:
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return body
+
+    def put(self, user_uuid, view, version, body):
+        key = (user_uuid, view)
+        with self._lock:
+            self._entries[key] = (version, time.monotonic(), body)
+            self._entries.move_to_end(key)
+            self._views.setdefault(user_uuid, set()).add(view)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate(self, user_uuid):
+        with self._lock:
+            for view in self._views.pop(user_uuid, ()):
+                del self._entries[(user_uuid, view)]
+
+    def _remove(self, key):
+        # Called with the lock held
+        del self._entries[key]
+        views = self._views[key[0]]
+        views.discard(key[1])
+        if not views:
+            del self._views[key[0]]
@@ -0,0 +1,176 @@
+"""Retention for angle_data: raw rows older than the window are compacted into daily summaries.
+
+    python retention.py [--days 30] [--interval 3600] [--enable-incremental-vacuum]
+
+Each batch compacts one rowid range of angle_data into angle_daily (count, min,
+max, sum per user, exercise and day) and angle_daily_histogram (1-degree bins),
+then deletes the raw rows, all in one short write transaction. Freed pages are
+handed back to the file system with incremental_vacuum between batches.
+Skip evaluation reads exercise_stats and exercise_histogram, which are never
+compacted, so it is unaffected, and the cached GET / and assessment views read
+only results, so compaction leaves them valid.
+"""
+import argparse
+import os
+import time
+from datetime import datetime, timedelta, timezone
+
+from db import connect
+from metrics import SQLITE_WAIT_SECONDS
+from migrations import migrate
+
+# Raw angle_data rows are kept this many days
+RETENTION_DAYS = float(os.environ.get('ANGLE_RETENTION_DAYS', 30))
+# Rows compacted per write transaction, and the pause between transactions that lets requests write
+RETENTION_BATCH_ROWS = int(os.environ.get('RETENTION_BATCH_ROWS', 5000))
+RETENTION_PAUSE = float(os.environ.get('RETENTION_PAUSE', 0.05))
+# Free pages returned to the file system after each batch
+RETENTION_VACUUM_PAGES = int(os.environ.get('RETENTION_VACUUM_PAGES', 1000))
+
+_RANGE = 'FROM angle_data WHERE rowid > ? AND rowid <= ? AND timestamp < ?'
+
+
+def cutoff_timestamp(days, now=None):
+    """The angle_data timestamp before which rows are compacted."""
+    now = now or datetime.now(timezone.utc)
+    return (now - timedelta(days=days)).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def compact_batch(conn, cutoff, after_rowid, batch_rows=RETENTION_BATCH_ROWS):
+    """Compact the old rows among the next `batch_rows` rows of angle_data after `after_rowid`.
+
+    Returns (last rowid of the range, rows compacted), or (None, 0) once the range
+    holds no row older than `cutoff`: rows are appended in time order, so the
+    remaining ones are all within the retention window.
+    """
+    with SQLITE_WAIT_SECONDS.time('retention'):
+        conn.execute('BEGIN IMMEDIATE')
+    try:
+        last_rowid, oldest = conn.execute(
+            'SELECT MAX(rowid), MIN(timestamp) FROM '
+            '(SELECT rowid, timestamp FROM angle_data WHERE rowid > ? ORDER BY rowid LIMIT ?)',
+            (after_rowid, batch_rows)).fetchone()
+        if last_rowid is None or oldest is None or oldest >= cutoff:
+            conn.rollback()
+            return None, 0
+
+        params = (after_rowid, last_rowid, cutoff)
+        conn.execute(f'''
+        INSERT INTO angle_daily (user_uuid, exercise_type, day, count, angle_min, angle_max, angle_sum)
+        SELECT user_uuid, exercise_type, date(timestamp), COUNT(*), MIN(angle), MAX(angle), SUM(angle)
+        {_RANGE}
+        GROUP BY user_uuid, exercise_type, date(timestamp)
+        ON CONFLICT (user_uuid, exercise_type, day) DO UPDATE SET
+            count = count + excluded.count,
+            angle_min = MIN(angle_min, excluded.angle_min),
+            angle_max = MAX(angle_max, excluded.angle_max),
+            angle_sum = angle_sum + excluded.angle_sum
+        ''', params)
+        conn.execute(f'''
+        INSERT INTO angle_daily_histogram (user_uuid, exercise_type, day, bin, count)
+        SELECT user_uuid, exercise_type, date(timestamp), CAST(angle AS INTEGER), COUNT(*)
+        {_RANGE}
+        GROUP BY user_uuid, exercise_type, date(timestamp), CAST(angle AS INTEGER)
+        ON CONFLICT (user_uuid, exercise_type, day, bin) DO UPDATE SET count = count + excluded.count
+        ''', params)
+        compacted = conn.execute('DELETE ' + _RANGE, params).rowcount
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return last_rowid, compacted
+
+
+def reclaim_space(conn, pages=RETENTION_VACUUM_PAGES):
+    """Return up to `pages` free pages to the file system; a no-op unless auto_vacuum is INCREMENTAL."""
+    if conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 2:
+        conn.execute(f'PRAGMA incremental_vacuum({int(pages)})').fetchall()
+
+
+def run_retention(days=RETENTION_DAYS, batch_rows=RETENTION_BATCH_ROWS, pause=RETENTION_PAUSE,
+                  vacuum_pages=RETENTION_VACUUM_PAGES, path=None):
+    """Compact every angle_data row older than `days`, one batch at a time; returns the rows compacted."""
+    conn = connect(path)
+    conn.isolation_level = None  # transactions are opened explicitly
+    try:
+        cutoff = cutoff_timestamp(days)
+        after_rowid, total = 0, 0
+        while True:
+            after_rowid, compacted = compact_batch(conn, cutoff, after_rowid, batch_rows)
+            if after_rowid is None:
+                break
+            total += compacted
+            reclaim_space(conn, vacuum_pages)
+            time.sleep(pause)
+        return total
+    finally:
+        conn.close()
+
+
+def enable_incremental_vacuum(path=None):
+    """Switch an existing database to auto_vacuum=INCREMENTAL.
+
+    This rewrites the whole file with VACUUM and blocks every writer meanwhile, so
+    run it once during maintenance. New databases are created with it already.
+    """
+    conn = connect(path)
+    try:
+        conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
+        conn.execute('VACUUM')
+        return conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 2
+    finally:
+        conn.close()
+
+
+def angle_history(conn, user_uuid, exercise_type):
+    """Per-day count, min, max and mean of a user's angles for one exercise, from both tiers."""
+    days = {}
+    compacted = conn.execute('''
+        SELECT day, count, angle_min, angle_max, angle_sum FROM angle_daily
+        WHERE user_uuid = ? AND exercise_type = ? ORDER BY day
+    ''', (user_uuid, exercise_type))
+    # Raw rows are bounded by the retention window
+    raw = conn.execute('''
+        SELECT date(timestamp), COUNT(*), MIN(angle), MAX(angle), SUM(angle) FROM angle_data
+        WHERE user_uuid = ? AND exercise_type = ? GROUP BY date(timestamp)
+    ''', (user_uuid, exercise_type))
+    for rows in (compacted.fetchall(), raw.fetchall()):
+        for day, count, angle_min, angle_max, angle_sum in rows:
+            if day in days:
+                # A day can be partly compacted while the batch that finishes it is pending
+                before = days[day]
+                count, angle_sum = count + before[0], angle_sum + before[3]
+                angle_min, angle_max = min(angle_min, before[1]), max(angle_max, before[2])
+            days[day] = (count, angle_min, angle_max, angle_sum)
+    return [
+        {"day": day, "count": count, "min": angle_min, "max": angle_max, "mean": angle_sum / count}
+        for day, (count, angle_min, angle_max, angle_sum) in sorted(days.items())
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--days', type=float, default=RETENTION_DAYS, help='days of raw rows to keep')
+    parser.add_argument('--batch-rows', type=int, default=RETENTION_BATCH_ROWS)
+    parser.add_argument('--pause', type=float, default=RETENTION_PAUSE, help='seconds between batches')
+    parser.add_argument('--vacuum-pages', type=int, default=RETENTION_VACUUM_PAGES)
+    parser.add_argument('--interval', type=float, default=0,
+                        help='keep running, compacting every this many seconds (default: run once)')
+    parser.add_argument('--enable-incremental-vacuum', action='store_true',
+                        help='switch an existing database to incremental auto_vacuum first (runs VACUUM)')
+    args = parser.parse_args()
+
+    migrate()
+    if args.enable_incremental_vacuum:
+        print('Incremental vacuum enabled:', enable_incremental_vacuum())
+    while True:
+        started = time.monotonic()
+        compacted = run_retention(args.days, args.batch_rows, args.pause, args.vacuum_pages)
+        print(f'Compacted {compacted} angle_data rows in {time.monotonic() - started:.1f}s', flush=True)
+        if not args.interval:
+            break
+        time.sleep(args.interval)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,10 @@
+import os
+import sys
+import tempfile
+
+# The modules live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# app.py migrates its database when imported: give it a scratch one, written inline
+os.environ.setdefault('AI_DB_PATH', os.path.join(tempfile.mkdtemp(), 'test.db'))
+os.environ.setdefault('ANGLE_WRITE_BEHIND', '0')
@@ -0,0 +1,48 @@
+import pytest
+
+import app as app_module
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(app_module, 'ADMIN_TOKEN', 'secret')
+    yield app_module.app.test_client()
+    app_module.profiler.stop()
+
+
+def admin_post(client, path, body=None, **kwargs):
+    return client.post(path, json=body, headers={'X-Admin-Token': 'secret'}, **kwargs)
+
+
+@pytest.mark.parametrize('body', [
+    {'route': '/', 'requests': '20'},
+    {'route': '/', 'requests': 0},
+    {'route': '/', 'requests': 2.5},
+    {'route': '/', 'requests': True},
+    {'route': '/', 'seconds': 'soon'},
+    {'route': '/', 'seconds': -1},
+    {'route': '/'},
+    {'route': ['/'], 'requests': 1},
+    {'route': '/', 'method': 1, 'requests': 1},
+    {'requests': 1},
+    [],
+])
+def test_profile_rejects_invalid_limits(client, body):
+    assert admin_post(client, '/admin/profile', body).status_code == 400
+    assert client.get('/', json={'userUUID': 'nobody'}).status_code == 200
+
+
+def test_profile_without_body(client):
+    response = client.post('/admin/profile', data='', headers={'X-Admin-Token': 'secret'})
+    assert response.status_code == 400
+
+
+def test_profile_accepts_positive_limits(client):
+    response = admin_post(client, '/admin/profile', {'route': '/', 'requests': 2, 'seconds': 0.5})
+    assert response.status_code == 201
+    assert client.get('/', json={'userUUID': 'nobody'}).status_code == 200
+
+
+@pytest.mark.parametrize('body', [{'action': 'start', 'frames': 'x'}, {'action': 'start', 'frames': 0}, None])
+def test_tracemalloc_rejects_invalid_frames(client, body):
+    assert admin_post(client, '/admin/tracemalloc', body).status_code == 400
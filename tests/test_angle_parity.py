@@ -0,0 +1,69 @@
+import warnings
+
+import numpy as np
+import pytest
+
+from angle_functions import PoseGeometry
+from config import exercise_config
+from keypoints import decode_frames, frames_with_keypoints
+
+FRAME_SHAPE = (720, 1280)
+
+
+def seeded_content(frames=1500, seed=0):
+    """Random poses as sent in `content`, with missing keypoints, empty frames and coincident keypoints."""
+    rng = np.random.default_rng(seed)
+    content = []
+    for t in range(frames):
+        base = rng.random((17, 2))
+        if t % 7 == 0:
+            # Zero-length shoulder, hip and upper-arm vectors
+            base[6] = base[5]
+            base[12] = base[11]
+            base[7] = base[5]
+            base[8] = base[6]
+            base[0] = (base[5] + base[6]) / 2
+        data = [{'id': i, 'x': float(x), 'y': float(y), 'score': 0.9}
+                for i, (x, y) in enumerate(base) if rng.random() >= 0.05]
+        content.append({'time': t, 'data': data if t % 11 else []})
+    return content
+
+
+CONTENT = seeded_content()
+
+
+def batch_angles(entry, geometry):
+    times, points, present = decode_frames(CONTENT)
+    valid = frames_with_keypoints(present, entry['keypoints'])
+    angles = np.full(len(times), np.nan)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if geometry:
+            angles[valid] = entry['batch_function'](PoseGeometry(points, FRAME_SHAPE), FRAME_SHAPE)[valid]
+        else:
+            angles[valid] = entry['batch_function'](points[valid], FRAME_SHAPE)
+    return valid, angles
+
+
+@pytest.mark.parametrize('geometry', [False, True], ids=['points', 'geometry'])
+@pytest.mark.parametrize('name', list(exercise_config))
+def test_batch_function_matches_angle_function(name, geometry):
+    entry = exercise_config[name]
+    valid, angles = batch_angles(entry, geometry)
+    assert valid.any() and not valid.all()
+
+    compared = 0
+    for i, frame in enumerate(CONTENT):
+        keypoints = {kp['id']: kp for kp in frame['data']}
+        assert valid[i] == (bool(frame['data']) and all(kp in keypoints for kp in entry['keypoints']))
+        if not valid[i]:
+            continue
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            expected = entry['angle_function'](keypoints, FRAME_SHAPE)
+        # Both must accept or reject the frame alike, and agree on accepted angles
+        accepted = 0 < expected < entry['angle_max']
+        assert accepted == (0 < angles[i] < entry['angle_max']), (i, expected, angles[i])
+        if accepted:
+            assert angles[i] == pytest.approx(expected, abs=1e-9), i
+            compared += 1
+    assert compared > 0
@@ -0,0 +1,76 @@
+import sqlite3
+
+import pytest
+
+import app as app_module
+from angle_writer import AngleWriter
+from db import DB_PATH, connect
+from migrations import migrate
+
+
+@pytest.fixture
+def path(tmp_path):
+    path = str(tmp_path / 'test.db')
+    conn = connect(path)
+    migrate(conn)
+    conn.close()
+    return path
+
+
+def rows(user_uuid, count):
+    return [(user_uuid, 'back_flexion', float(i), '2026-01-01 00:00:00') for i in range(count)]
+
+
+def stored(path, user_uuid):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute('SELECT COUNT(*) FROM angle_data WHERE user_uuid = ?', (user_uuid,)).fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_held_rows_wait_for_release(path):
+    writer = AngleWriter(path, flush_interval=0)
+    held = writer.submit(rows('held', 3), held=True)
+    writer.submit(rows('free', 2))
+    assert writer.flush(timeout=0.5) is False
+    assert stored(path, 'free') == 2 and stored(path, 'held') == 0
+
+    writer.release(held)
+    assert writer.flush(timeout=5)
+    assert stored(path, 'held') == 3
+    writer.close()
+
+
+def test_cancelled_rows_are_never_written(path):
+    writer = AngleWriter(path, flush_interval=0)
+    writer.cancel(writer.submit(rows('cancelled', 3), held=True))
+    assert writer.flush(timeout=5)
+    writer.close()
+    assert stored(path, 'cancelled') == 0
+
+
+def test_full_queue_is_refused_at_once(path):
+    writer = AngleWriter(path, max_pending_rows=4, flush_interval=0)
+    held = writer.submit(rows('a', 3), held=True)
+    assert writer.submit(rows('b', 3)) is None
+    writer.release(held)
+    writer.close()
+
+
+def test_rolled_back_unit_of_work_writes_no_angles(monkeypatch):
+    writer = AngleWriter(flush_interval=0)
+    monkeypatch.setattr(app_module, 'angle_writer', writer)
+    monkeypatch.setattr(app_module, 'WRITE_BEHIND_ENABLED', True)
+
+    def fail(cursor, timestamp):
+        raise sqlite3.OperationalError('disk I/O error')
+
+    unit_of_work = app_module.UnitOfWork()
+    unit_of_work.store_angles('rolled-back', 'back_flexion', [10.0, 20.0])
+    monkeypatch.setattr(unit_of_work, '_write_stats_and_results', fail)
+    with pytest.raises(sqlite3.OperationalError):
+        unit_of_work.commit()
+    assert writer.flush(timeout=5)
+    writer.close()
+    assert stored(DB_PATH, 'rolled-back') == 0
@@ -0,0 +1,101 @@
+import asyncio
+import json
+
+import pytest
+
+import app as app_module
+import asgi
+from benchmark import as_content, synthetic_poses
+
+META = {'frame_shape': {'x': 1280, 'y': 720}, 'exercise_type': 'back_flexion'}
+
+
+def call(method, path, body=b'', content_type=b'application/json', chunk_size=4096, disconnect_after=None):
+    """Run one request through asgi.application; returns (status, body)."""
+    scope = {'type': 'http', 'method': method, 'path': path, 'query_string': b'', 'http_version': '1.1',
+             'scheme': 'http', 'server': ('test', 80), 'client': ('127.0.0.1', 1234),
+             'headers': [(b'content-type', content_type)]}
+    chunks = [body[i:i + chunk_size] for i in range(0, len(body), chunk_size)] or [b'']
+    received = 0
+    response = {'status': None, 'body': b''}
+
+    async def receive():
+        nonlocal received
+        await asyncio.sleep(0)
+        received += 1
+        if disconnect_after is not None and received > disconnect_after:
+            return {'type': 'http.disconnect'}
+        chunk = chunks.pop(0)
+        return {'type': 'http.request', 'body': chunk, 'more_body': bool(chunks)}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            response['status'] = message['status']
+        else:
+            response['body'] += message.get('body', b'')
+
+    asyncio.run(asgi.application(scope, receive, send))
+    return response['status'], response['body']
+
+
+def session(user_uuid, frames=600):
+    return {'userUUID': user_uuid, 'meta': META, 'content': as_content(*synthetic_poses('back_flexion', frames))}
+
+
+def ndjson(data):
+    lines = [{'userUUID': data['userUUID'], 'meta': data['meta']}] + data['content']
+    return b''.join(json.dumps(line).encode() + b'\n' for line in lines)
+
+
+def stored_results(user_uuid):
+    conn = app_module.get_connection()
+    return conn.execute('SELECT COUNT(*) FROM results WHERE user_uuid = ?', (user_uuid,)).fetchone()[0]
+
+
+def test_patch_matches_wsgi():
+    expected = app_module.app.test_client().patch('/', json=session('asgi-wsgi')).get_json()
+    status, body = call('PATCH', '/', json.dumps(session('asgi-json')).encode())
+    assert status == 200
+    assert json.loads(body) == dict(expected, userUUID='asgi-json')
+
+
+def test_chunked_ndjson_is_scored_while_it_arrives():
+    expected = app_module.app.test_client().patch('/', json=session('ndjson-wsgi')).get_json()
+    status, body = call('PATCH', '/', ndjson(session('ndjson')), b'application/x-ndjson', chunk_size=1000)
+    assert status == 200
+    assert json.loads(body) == dict(expected, userUUID='ndjson')
+
+
+def test_disconnect_mid_upload_stores_nothing():
+    status, _ = call('PATCH', '/', ndjson(session('gone')), b'application/x-ndjson', chunk_size=1000,
+                     disconnect_after=5)
+    assert status == 400
+    assert stored_results('gone') == 0
+
+
+def test_only_buffered_bodies_are_capped(monkeypatch):
+    monkeypatch.setattr(asgi, 'ASGI_MAX_BODY_BYTES', 1000)
+    status, body = call('PATCH', '/', json.dumps(session('too-large')).encode())
+    assert status == 413
+    assert json.loads(body) == {"error": "Request body too large"}
+    status, _ = call('PATCH', '/', ndjson(session('streamed-large')), b'application/x-ndjson')
+    assert status == 200
+
+
+def test_websocket_is_declined():
+    sent = []
+
+    async def receive():
+        return {'type': 'websocket.connect'}
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(asgi.application({'type': 'websocket', 'path': '/'}, receive, send))
+    assert sent == [{'type': 'websocket.close', 'code': 1008}]
+
+
+@pytest.mark.parametrize('path, expected', [('/metrics', 200), ('/no-such-route', 404)])
+def test_other_routes(path, expected):
+    status, _ = call('GET', path)
+    assert status == expected
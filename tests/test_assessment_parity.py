@@ -0,0 +1,95 @@
+from collections import Counter
+
+import numpy as np
+import pytest
+
+from assessment_config import ASSESSMENT_CONFIG
+from assessment_plan import ASSESSMENT_PLANS
+
+
+def reference_summary(assessment, user_data):
+    """Charts, table and overall status as generate_assessment_summary computed them before plans."""
+    charts_output = []
+    table_output = []
+    all_status_values = []
+
+    for chart in assessment["charts"]:
+        body_detail = {}
+        for part, mapped_exercises in chart["body_parts"].items():
+            relevant_angles = [user_data[ex] for ex in mapped_exercises if ex in user_data]
+            if relevant_angles:
+                avg_angle = sum(relevant_angles) / len(relevant_angles)
+                normal_range_values = []
+                for ex in mapped_exercises:
+                    for move_key, norm in assessment["table_movements"].items():
+                        if ex == move_key:
+                            normal_range_values.append(norm)
+                if normal_range_values:
+                    avg_normal = sum(normal_range_values) / len(normal_range_values)
+                else:
+                    avg_normal = 1
+                percent = avg_angle / avg_normal
+                if percent >= 0.75:
+                    status = "good"
+                elif percent >= 0.5:
+                    status = "fair"
+                else:
+                    status = "poor"
+            else:
+                status = "poor"
+            body_detail[part] = status
+            all_status_values.append(status)
+        charts_output.append({
+            "chart_title": chart["chart_title"],
+            "chart_type": chart["chart_type"],
+            "body_detail": body_detail
+        })
+
+    for movement, normal_range in assessment["table_movements"].items():
+        result_angle = user_data.get(movement, 0)
+        percent = result_angle / normal_range if normal_range > 0 else 0
+        if percent >= 0.75:
+            color = "green"
+        elif percent >= 0.5:
+            color = "orange"
+        else:
+            color = "red"
+        table_output.append({
+            "movment": movement,
+            "result": round(result_angle, 1),
+            "normal_range": normal_range,
+            "color": color
+        })
+
+    most_common = Counter(all_status_values).most_common(1)
+    return {
+        "overall": most_common[0][0] if most_common else "poor",
+        "charts": charts_output,
+        "table": table_output
+    }
+
+
+def seeded_user_data(plan, seed):
+    """A random subset of the plan's exercises, with angles on and around the 50% and 75% thresholds."""
+    rng = np.random.default_rng(seed)
+    normal = dict(zip(plan.movements, plan.normal_ranges.tolist()))
+    user_data = {}
+    for exercise in plan.exercises:
+        if rng.random() < 0.3:
+            continue
+        scale = normal.get(exercise) or 100
+        if rng.random() < 0.3:
+            user_data[exercise] = float(scale * rng.choice([0.5, 0.75]))
+        else:
+            user_data[exercise] = float(rng.uniform(0, 1.2 * scale))
+    # Exercises outside the assessment are ignored by both
+    user_data['not_in_any_assessment'] = 45.0
+    return user_data
+
+
+@pytest.mark.parametrize('seed', range(25))
+@pytest.mark.parametrize('name', list(ASSESSMENT_CONFIG))
+def test_plan_matches_reference_summary(name, seed):
+    plan = ASSESSMENT_PLANS[name]
+    user_data = seeded_user_data(plan, seed) if seed else {}
+    assert plan.evaluate(user_data) == reference_summary(ASSESSMENT_CONFIG[name], user_data)
@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+from keypoints import decimate
+
+FRAME_SHAPE = (720, 1280)
+
+
+def decimate_frame_by_frame(times, points, candidates, keypoint_ids, threshold, min_interval):
+    """The decimation rule applied one frame at a time."""
+    keep = np.zeros(len(times), dtype=bool)
+    last_time = last_coords = None
+    for i in np.flatnonzero(candidates):
+        coords = points[i, keypoint_ids] * np.array([FRAME_SHAPE[1], FRAME_SHAPE[0]])
+        if last_coords is not None:
+            if min_interval and times[i] is not None and last_time is not None and times[i] - last_time < min_interval:
+                continue
+            if ((coords - last_coords) ** 2).sum(axis=1).max() < threshold * threshold:
+                continue
+        keep[i] = True
+        last_time, last_coords = times[i], coords
+    return keep
+
+
+def seeded_session(frames=3000, seed=0):
+    """A random walk with holds, some rejected frames and some frames without a time."""
+    rng = np.random.default_rng(seed)
+    steps = rng.normal(0, 2 / FRAME_SHAPE[1], (frames, 17, 2))
+    steps[(np.arange(frames) // 200) % 2 == 1] /= 50
+    points = 0.5 + np.cumsum(steps, axis=0)
+    times = [None if rng.random() < 0.05 else 33 * t for t in range(frames)]
+    return times, points, rng.random(frames) < 0.8
+
+
+@pytest.mark.parametrize('threshold, min_interval', [(0, 0), (3, 0), (10, 0), (3, 100)])
+@pytest.mark.parametrize('lookahead', [1, 8])
+def test_decimate_matches_frame_by_frame(threshold, min_interval, lookahead):
+    times, points, candidates = seeded_session()
+    keypoint_ids = [5, 6, 11, 12]
+    expected = decimate_frame_by_frame(times, points, candidates, keypoint_ids, threshold, min_interval)
+
+    keep, _ = decimate(times, points, candidates, keypoint_ids, FRAME_SHAPE, threshold, min_interval,
+                       lookahead=lookahead)
+    assert (keep == expected).all()
+
+    # Chunk by chunk, carrying the state along
+    chunks, last = [], None
+    for start in range(0, len(times), 97):
+        stop = start + 97
+        chunk, last = decimate(times[start:stop], points[start:stop], candidates[start:stop], keypoint_ids,
+                               FRAME_SHAPE, threshold, min_interval, last, lookahead=lookahead)
+        chunks.append(chunk)
+    assert (np.concatenate(chunks) == expected).all()
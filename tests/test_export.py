@@ -0,0 +1,37 @@
+import pytest
+
+pytest.importorskip('pyarrow')
+import pyarrow.dataset as ds  # noqa: E402
+
+from db import connect  # noqa: E402
+from export import export  # noqa: E402
+from migrations import migrate  # noqa: E402
+
+
+def add_angles(conn, user_uuid, count):
+    with conn:
+        conn.executemany('INSERT INTO angle_data (user_uuid, exercise_type, angle) VALUES (?, ?, ?)',
+                         [(user_uuid, 'back_flexion', float(i)) for i in range(count)])
+
+
+def exported_angles(output_dir):
+    return ds.dataset(str(output_dir / 'angle_data'), partitioning='hive').to_table().to_pandas()
+
+
+def test_rows_added_after_deleting_the_newest_rows_are_exported(tmp_path):
+    path = str(tmp_path / 'test.db')
+    conn = connect(path)
+    migrate(conn)
+    add_angles(conn, 'a', 10)
+    add_angles(conn, 'b', 10)
+    assert export(tmp_path / 'out', tables=['angle_data'], path=path) == {'angle_data': 20}
+
+    with conn:
+        conn.execute("DELETE FROM angle_data WHERE user_uuid = 'b'")
+    add_angles(conn, 'c', 5)
+    assert export(tmp_path / 'out', tables=['angle_data'], path=path) == {'angle_data': 5}
+
+    angles = exported_angles(tmp_path / 'out')
+    assert len(angles) == 25
+    assert not angles['rowid'].duplicated().any()
+    assert (angles['user_uuid'] == 'c').sum() == 5
@@ -0,0 +1,41 @@
+import threading
+import time
+
+from db import connect
+from migrations import MIGRATIONS, migrate, unindexed_queries
+
+
+def test_hot_queries_use_indexes(tmp_path):
+    conn = connect(str(tmp_path / 'test.db'))
+    assert migrate(conn) == len(MIGRATIONS)
+    assert unindexed_queries(conn) == {}
+
+
+def test_migrate_is_idempotent(tmp_path):
+    conn = connect(str(tmp_path / 'test.db'))
+    migrate(conn)
+    assert migrate(conn) == len(MIGRATIONS)
+    assert conn.execute('PRAGMA user_version').fetchone()[0] == len(MIGRATIONS)
+
+
+def test_migrate_waits_for_another_worker_past_the_busy_timeout(tmp_path):
+    path = str(tmp_path / 'test.db')
+    connect(path).close()
+    locked = threading.Event()
+
+    def hold_write_lock():
+        conn = connect(path)
+        conn.execute('BEGIN IMMEDIATE')
+        locked.set()
+        time.sleep(0.5)
+        conn.commit()
+        conn.close()
+
+    worker = threading.Thread(target=hold_write_lock)
+    worker.start()
+    locked.wait()
+    conn = connect(path)
+    conn.execute('PRAGMA busy_timeout = 50')
+    assert migrate(conn) == len(MIGRATIONS)
+    assert conn.execute('PRAGMA busy_timeout').fetchone()[0] == 50
+    worker.join()
@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+import app as app_module
+import parallel
+from benchmark import as_content, synthetic_poses
+from exercise_registry import EXERCISES
+
+FRAME_SHAPE = (720, 1280)
+META = {'frame_shape': {'x': 1280, 'y': 720}}
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    """A two-process pool that takes any upload, used by the routes in place of angle_pool."""
+    pool = parallel.AnglePool(workers=2, min_frames=1, chunk_frames=700)
+    monkeypatch.setattr(parallel, 'PARALLEL_ANGLES', True)
+    monkeypatch.setattr(app_module, 'angle_pool', pool)
+    yield pool
+    pool.close()
+
+
+def recording(frames=3000, seed=0):
+    """Movements of several exercises back to back, with a few frames of random and coincident keypoints."""
+    parts = [synthetic_poses(exercise, frames // 3, seed) for exercise in ('back_flexion', 'neck_flexion',
+                                                                          'shoulder_abduction')]
+    points = np.concatenate([points for _, points in parts])
+    rng = np.random.default_rng(seed)
+    noisy = rng.choice(len(points), len(points) // 10, replace=False)
+    points[noisy] = rng.random((len(noisy), 17, 2))
+    points[noisy[::5], 6] = points[noisy[::5], 5]
+    return list(range(len(points))), points
+
+
+def without_user(body):
+    # Multi-exercise responses repeat the userUUID in every result
+    if isinstance(body, dict):
+        return {key: without_user(value) for key, value in body.items() if key != 'userUUID'}
+    return body
+
+
+def test_pool_matches_in_process(pool):
+    _, points = recording()
+    keys = list(EXERCISES)
+    expected = np.empty((len(keys), len(points)))
+    parallel._score(points, keys, FRAME_SHAPE, expected)
+
+    angles = pool.compute(keys, points, FRAME_SHAPE)
+    assert list(angles) == keys
+    assert pool._executor is not None  # scored by the processes, not the in-process fallback
+    for row, key in enumerate(keys):
+        np.testing.assert_array_equal(angles[key], expected[row], err_msg=key)
+
+
+@pytest.mark.parametrize('meta', [{'exercise_type': 'back_flexion'}, {'exercise_types': 'all'}],
+                         ids=['single', 'all'])
+def test_patch_matches_in_process(pool, meta):
+    content = as_content(*recording())
+    client = app_module.app.test_client()
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(parallel, 'PARALLEL_ANGLES', False)
+        assert not pool.accepts(len(content))
+        expected = client.patch('/', json={'userUUID': 'in-process', 'meta': dict(META, **meta),
+                                           'content': content}).get_json()
+    assert pool.accepts(len(content))
+
+    response = client.patch('/', json={'userUUID': 'pooled', 'meta': dict(META, **meta), 'content': content})
+    assert response.status_code == 200
+    assert pool._executor is not None
+    assert without_user(response.get_json()) == without_user(expected)
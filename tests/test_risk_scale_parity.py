@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+from angle_functions import RiskScale, determine_risk
+from config import exercise_config
+
+
+def risk_amount(angle, risk_ranges):
+    """Risk amount of one angle as computed by the summary loop before RiskScale."""
+    if risk_ranges['low'][0] <= angle <= risk_ranges['low'][1]:
+        normalized_value = (angle - risk_ranges['low'][0]) / (risk_ranges['low'][1] - risk_ranges['low'][0])
+        return normalized_value * 3
+    elif risk_ranges['medium'][0] <= angle <= risk_ranges['medium'][1]:
+        normalized_value = (angle - risk_ranges['medium'][0]) / (risk_ranges['medium'][1] - risk_ranges['medium'][0])
+        return 3 + normalized_value * 3
+    elif risk_ranges['high'][0] <= angle <= risk_ranges['high'][1]:
+        normalized_value = (angle - risk_ranges['high'][0]) / (risk_ranges['high'][1] - risk_ranges['high'][0])
+        return 6 + normalized_value * 2
+    return 0
+
+
+def seeded_angles(risk_ranges, seed=0):
+    """Random angles around the ranges, plus every bound and its nearest neighbours."""
+    rng = np.random.default_rng(seed)
+    bounds = np.array([bound for level in ('low', 'medium', 'high') for bound in risk_ranges[level]], dtype=float)
+    edges = np.concatenate([bounds, np.nextafter(bounds, -np.inf), np.nextafter(bounds, np.inf),
+                            bounds - 0.5, bounds + 0.5])
+    spread = rng.uniform(bounds.min() - 30, bounds.max() + 30, 2000)
+    return np.concatenate([edges, spread, np.round(spread), [-1.0, 0.0]])
+
+
+@pytest.mark.parametrize('name', list(exercise_config))
+def test_risk_scale_matches_determine_risk(name):
+    risk_ranges = exercise_config[name]['risk_ranges']
+    scale = RiskScale(risk_ranges)
+    angles = seeded_angles(risk_ranges)
+
+    labels = scale.classify(angles)
+    amounts = scale.score(angles)
+    for angle, label, amount in zip(angles.tolist(), labels, amounts.tolist()):
+        assert label == determine_risk(angle, risk_ranges), angle
+        assert scale.label(angle) == label, angle
+        assert amount == risk_amount(angle, risk_ranges), angle
@@ -0,0 +1,92 @@
+import json
+
+import numpy as np
+import pytest
+
+import app as app_module
+from benchmark import as_content, synthetic_poses
+from keypoints import PACKED_MIMETYPE, encode_packed
+
+
+def store_result(user_uuid, exercise_type, skip):
+    conn = app_module.get_connection()
+    with conn:
+        conn.execute('INSERT INTO results (user_uuid, exercise_type, average_angle, risk_label, best_angle, '
+                     'top_12_angles, skip) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                     (user_uuid, exercise_type, 10.0, 'Low Risk', '10.0', '[{"Time": 0, "Angle": 10.0}]', skip))
+
+
+def test_get_lists_results_in_the_order_they_were_stored():
+    stored = [('back_flexion', '1'), ('neck_flexion', '0'), ('knee_raise_left', '1'), ('shoulder_abduction', '0')]
+    for exercise_type, skip in stored:
+        store_result('stored-order', exercise_type, skip)
+    response = app_module.app.test_client().get('/', json={'userUUID': 'stored-order'})
+    assert [entry['exercise_key'] for entry in response.get_json()['exercises']] == [key for key, _ in stored]
+
+
+def test_decimation_does_not_change_skip():
+    content = as_content(*synthetic_poses('back_flexion', 600))
+    client = app_module.app.test_client()
+    conn = app_module.get_connection()
+    stats, stored = {}, {}
+    for decimate in (False, True):
+        user_uuid = f'decimate-{decimate}'
+        response = client.patch('/', json={'userUUID': user_uuid, 'content': content, 'meta': {
+            'frame_shape': {'x': 1280, 'y': 720}, 'exercise_type': 'back_flexion', 'decimate': decimate}})
+        assert response.status_code == 200
+        stats[decimate] = (response.get_json()['skip'], conn.execute(
+            'SELECT attempts, below_min FROM exercise_stats WHERE user_uuid = ?', (user_uuid,)).fetchone())
+        stored[decimate] = conn.execute('SELECT COUNT(*) FROM angle_data WHERE user_uuid = ?',
+                                        (user_uuid,)).fetchone()[0]
+    assert stored[True] < stored[False]
+    assert stats[True] == stats[False]
+
+
+META = {'frame_shape': {'x': 1280, 'y': 720}, 'exercise_type': 'back_flexion'}
+FRAME = {'time': 0, 'data': [{'id': 5, 'x': 0.5, 'y': 0.5}]}
+
+
+@pytest.mark.parametrize('content', [
+    {'time': 0, 'data': []}, 'frames', [FRAME, {'time': 1}], [FRAME, {'time': 1, 'data': 'keypoints'}],
+    [FRAME, 3], [{'time': 0, 'data': [{'x': 0.5, 'y': 0.5}]}], [{'time': 0, 'data': [{'id': 1.5, 'x': 0, 'y': 0}]}],
+], ids=['dict', 'string', 'no-data', 'data-string', 'frame-number', 'no-id', 'float-id'])
+def test_malformed_frames_are_rejected(content):
+    client = app_module.app.test_client()
+    response = client.patch('/', json={'userUUID': 'malformed', 'meta': META, 'content': content})
+    assert response.status_code == 400
+
+    if isinstance(content, list):
+        # Streamed, one frame per line
+        lines = [{'userUUID': 'malformed', 'meta': META}] + content
+        response = client.patch('/', data=''.join(json.dumps(line) + '\n' for line in lines),
+                                content_type='application/x-ndjson')
+        assert response.status_code == 400
+
+    session_id = client.post('/live', json={'userUUID': 'malformed', 'meta': META}).get_json()['sessionId']
+    assert client.post(f'/live/{session_id}/frames', json={'content': content}).status_code == 400
+    assert client.post(f'/live/{session_id}/frames', json={'content': [FRAME]}).status_code == 200
+
+    response = client.post('/batch', json=[{'userUUID': 'malformed', 'meta': META, 'content': content}])
+    assert response.get_json()['results'][0]['status'] == 400
+
+
+@pytest.mark.parametrize('body', [b'', b'[1, 2]', b'"content"'], ids=['empty', 'list', 'string'])
+def test_live_frames_need_a_json_object(body):
+    client = app_module.app.test_client()
+    session_id = client.post('/live', json={'userUUID': 'malformed', 'meta': META}).get_json()['sessionId']
+    response = client.post(f'/live/{session_id}/frames', data=body, content_type='application/json')
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize('body', [b'1', b'[1, 2]'], ids=['number', 'list'])
+def test_patch_needs_a_json_object(body):
+    response = app_module.app.test_client().patch('/', data=body, content_type='application/json')
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize('header', [[1, 2], 'meta userUUID', 7], ids=['list', 'string', 'number'])
+def test_packed_header_must_be_an_object(header):
+    body = encode_packed(header, [0], np.full((1, 17, 2), 0.5))
+    response = app_module.app.test_client().patch('/', data=body, content_type=PACKED_MIMETYPE)
+    assert response.status_code == 400
+    assert response.get_json() == {"error": "Keypoint buffer header must be a JSON object"}
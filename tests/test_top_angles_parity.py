@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+from aggregation import TopAngles
+from angle_functions import determine_risk
+from config import exercise_config
+from exercise_registry import get_exercise
+
+pd = pytest.importorskip('pandas')
+
+
+def pandas_summary(times, angles, risk_ranges):
+    """The PATCH summary as computed with pandas before TopAngles."""
+    df = pd.DataFrame([{'Time': time, 'Angle': angle} for time, angle in zip(times, angles)])
+    df = df.nlargest(12, 'Angle')
+    average_angle = df['Angle'].mean()
+    top_12_angles = df[['Time', 'Angle']].to_dict(orient='records')
+    df['RiskLabel'] = df['Angle'].apply(lambda x: determine_risk(x, risk_ranges))
+    most_common_label = df['RiskLabel'].mode()[0]
+    df['Angle'] = df['Angle'].astype(int)
+    best_angle = df[df['RiskLabel'] == most_common_label]['Angle'].value_counts().idxmax()
+    return {
+        'average_angle': average_angle,
+        'top_12_angles': top_12_angles,
+        'risk_label': determine_risk(average_angle, risk_ranges),
+        'best_angle': float(best_angle),
+    }
+
+
+def seeded_session(entry, seed):
+    """Random accepted angles with repeated values, and int or mixed int/float times."""
+    rng = np.random.default_rng(seed)
+    count = int(rng.choice([1, 5, 12, 13, 40, 500]))
+    angles = rng.uniform(0, entry['angle_max'], count)
+    if seed % 2:
+        # Round to a coarse grid so equal angles and equal whole angles are common
+        angles = np.maximum(np.round(angles / 5) * 5, 0.5)
+    times = list(range(count))
+    if seed % 3 == 0:
+        times = [time + 0.5 if i % 4 == 0 else time for i, time in enumerate(times)]
+    return times, angles, rng
+
+
+@pytest.mark.parametrize('seed', range(12))
+@pytest.mark.parametrize('name', list(exercise_config))
+def test_top_angles_matches_pandas(name, seed):
+    entry = exercise_config[name]
+    times, angles, rng = seeded_session(entry, seed)
+
+    top = TopAngles()
+    # Push in random chunks, the way frames arrive from a stream
+    bounds = sorted(set(rng.integers(0, len(angles), 4).tolist()) | {0, len(angles)})
+    for start, end in zip(bounds, bounds[1:]):
+        top.push_many(times[start:end], angles[start:end])
+    summary = top.summary(get_exercise(name).risk_scale)
+
+    expected = pandas_summary(times, angles.tolist(), entry['risk_ranges'])
+    assert summary['average_angle'] == pytest.approx(expected['average_angle'], rel=1e-12)
+    assert summary['top_12_angles'] == expected['top_12_angles']
+    assert [type(row['Time']) for row in summary['top_12_angles']] == \
+        [type(row['Time']) for row in expected['top_12_angles']]
+    assert summary['risk_label'] == expected['risk_label']
+    assert summary['best_angle'] == expected['best_angle']